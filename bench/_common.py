@@ -0,0 +1,104 @@
+"""Helpers shared by the benchmark scripts.
+
+Each script is run directly (``python bench/bench_ingest.py``); importing this
+module puts the repository root on ``sys.path`` so the bot's modules import
+the same way they do in the tests.
+"""
+
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+CATEGORIES = ("Entertainment", "Music", "Productivity", "Cloud", "News", "Fitness", "Education")
+CURRENCIES = ("USD", "EUR", "UZS", "RUB")
+CYCLES = (("monthly", 1), ("monthly", 3), ("yearly", 1), ("weekly", 1), ("weekly", 2), ("daily", 30))
+SERVICES = (
+    "Netflix", "Spotify", "YouTube Premium", "Apple Music", "iCloud", "Google One", "Dropbox",
+    "Notion", "Figma", "GitHub", "ChatGPT Plus", "Disney Plus", "HBO Max", "Duolingo",
+    "Headspace", "Strava", "Kinopoisk", "Yandex Plus", "Telegram Premium", "Adobe CC",
+)
+
+
+@contextlib.contextmanager
+def temp_database(size: int = db.DB_POOL_SIZE):
+    """Install a pool on a fresh temporary database as ``db.pool``."""
+    with tempfile.TemporaryDirectory(prefix="yodda-bench-") as tmp:
+        old = db.pool
+        db.pool = db.ConnectionPool(os.path.join(tmp, "yodda.db"), size=size)
+        db.user_cache.invalidate()
+        try:
+            yield db.pool
+        finally:
+            db.pool.close()
+            db.pool = old
+            db.user_cache.invalidate()
+
+
+def fake_subscriptions(count: int, seed: int = 0, within_days: int = 60) -> list[dict]:
+    """``count`` mini-app subscription objects billing in the next ``within_days`` days."""
+    rng = random.Random(seed)
+    today = date.today()
+    subs = []
+    for i in range(count):
+        cycle, value = rng.choice(CYCLES)
+        subs.append({
+            "id": f"sub-{i}",
+            "name": f"{rng.choice(SERVICES)} {i % 97}",
+            "category": rng.choice(CATEGORIES),
+            "amount": round(rng.uniform(1, 60), 2),
+            "currency": rng.choice(CURRENCIES),
+            "billing_cycle_type": cycle,
+            "billing_cycle_value": value,
+            "next_billing_date": (today + timedelta(days=rng.randrange(within_days))).isoformat(),
+            "reminder_days": rng.choice((0, 1, 3, 7)),
+            "is_free_trial": rng.random() < 0.1,
+        })
+    return subs
+
+
+def make_subscriptions(count: int, seed: int = 0, start: int = 0) -> list:
+    """``count`` ``subscription_manager.Subscription`` objects with ids from ``start``."""
+    from subscription_manager import Subscription
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    return [
+        Subscription(
+            id=f"sub-{i}",
+            name=f"{rng.choice(SERVICES)} {i % 997}",
+            category=rng.choice(CATEGORIES),
+            price=round(rng.uniform(1, 60), 2),
+            renewal_date=now + timedelta(days=rng.randrange(365), hours=rng.randrange(24)),
+            billing_cycle=rng.choice(("monthly", "yearly", "weekly")),
+            reminder_days_before=rng.choice((0, 1, 3, 7)),
+            currency=rng.choice(CURRENCIES),
+        )
+        for i in range(start, start + count)
+    ]
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def report(label: str, seconds: float, ops: int | None = None, unit: str = "ops") -> None:
+    line = f"{label:<44} {seconds * 1000:10.1f} ms"
+    if ops:
+        line += f"  {ops / seconds:12,.0f} {unit}/s"
+    print(line)
+
+
+@contextlib.contextmanager
+def timer(label: str, ops: int | None = None, unit: str = "ops"):
+    start = time.perf_counter()
+    yield
+    report(label, time.perf_counter() - start, ops, unit)
@@ -0,0 +1,133 @@
+"""A local stand-in for the Telegram Bot API, for the network benchmarks.
+
+It answers ``sendMessage`` with Telegram's flood-control rules (a global
+messages-per-second limit and one message per second per chat, refused with
+429 and ``retry_after``), serves ``getUpdates`` long polls from an in-memory
+queue and accepts every other method.
+"""
+
+import asyncio
+import collections
+import time
+
+from aiohttp import web
+
+TOKEN = "123456:bench-token"
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }
+
+
+class FakeBotAPI:
+    def __init__(self, rate: float = 30.0, per_chat_interval: float = 1.0,
+                 latency: float = 0.0, retry_after: int = 1) -> None:
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.latency = latency
+        self.retry_after = retry_after
+        self._recent: collections.deque[float] = collections.deque()
+        self._last_by_chat: dict[int, float] = {}
+        self._updates: list[dict] = []
+        self._new_update = asyncio.Event()
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+        self.sent = 0
+        self.global_refusals = 0
+        self.chat_refusals = 0
+        self.peak_rate = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def push_update(self, update: dict) -> None:
+        self._updates.append(update)
+        self._new_update.set()
+
+    # ── Methods ──────────────────────────────────────────────────────────────
+    async def _handle(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = dict(await request.post()) if request.content_type != "application/json" \
+            else await request.json()
+        method = request.match_info["method"]
+        if method == "sendMessage":
+            return self._send_message(params)
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"})
+        return self._ok(True)
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _flood(self) -> web.Response:
+        return web.json_response({
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {self.retry_after}",
+            "parameters": {"retry_after": self.retry_after},
+        }, status=429)
+
+    def _send_message(self, params) -> web.Response:
+        now = time.monotonic()
+        chat_id = int(params["chat_id"])
+        while self._recent and self._recent[0] <= now - 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate:
+            self.global_refusals += 1
+            return self._flood()
+        if now - self._last_by_chat.get(chat_id, -1e9) < self.per_chat_interval:
+            self.chat_refusals += 1
+            return self._flood()
+        self._recent.append(now)
+        self._last_by_chat[chat_id] = now
+        self.peak_rate = max(self.peak_rate, len(self._recent))
+        self.sent += 1
+        return self._ok({
+            "message_id": self.sent,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        })
+
+    async def _get_updates(self, params) -> web.Response:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [u for u in self._updates if u["update_id"] >= offset]
+            if pending or time.monotonic() >= deadline:
+                # Confirmed updates are never asked for again.
+                self._updates = pending
+                return self._ok(pending[:100])
+            self._new_update.clear()
+            try:
+                async with asyncio.timeout(deadline - time.monotonic()):
+                    await self._new_update.wait()
+            except TimeoutError:
+                pass
@@ -0,0 +1,50 @@
+"""SubscriptionManager batch mutations against the per-item loop.
+
+Adds, edits and deletes N subscriptions once through ``add_many`` /
+``edit_many`` / ``delete_many`` and once one call at a time, each on a fresh
+manager.
+
+    python bench/bench_batch.py --subscriptions 100000
+"""
+
+import argparse
+
+from _common import make_subscriptions, timer
+from subscription_manager import SubscriptionManager
+
+
+def per_item(subs: list, edits: dict) -> None:
+    manager = SubscriptionManager()
+    with timer(f"loop:  add {len(subs):,}", len(subs)):
+        for sub in subs:
+            manager.add_subscription(sub)
+    with timer(f"loop:  edit {len(edits):,}", len(edits)):
+        for sub_id, changes in edits.items():
+            manager.edit_subscription(sub_id, **changes)
+    with timer(f"loop:  delete {len(subs):,}", len(subs)):
+        for sub in subs:
+            manager.delete_subscription(sub.id)
+
+
+def batched(subs: list, edits: dict) -> None:
+    manager = SubscriptionManager()
+    with timer(f"batch: add_many {len(subs):,}", len(subs)):
+        manager.add_many(subs)
+    with timer(f"batch: edit_many {len(edits):,}", len(edits)):
+        manager.edit_many(edits)
+    with timer(f"batch: delete_many {len(subs):,}", len(subs)):
+        manager.delete_many([sub.id for sub in subs])
+
+
+def main(count: int) -> None:
+    subs = make_subscriptions(count)
+    edits = {sub.id: {"price": sub.price + 1, "name": sub.name + " Plus"} for sub in subs}
+    per_item(subs, edits)
+    batched(subs, edits)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.subscriptions)
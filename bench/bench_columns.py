@@ -0,0 +1,53 @@
+"""Spending analytics over N subscriptions: NumPy columns against the loops.
+
+Runs ``total_monthly_cost``, ``spending_breakdown`` and
+``cash_flow_projection`` twice: on the ``SpendingColumns`` store and on the
+plain loop fallback the manager uses without NumPy.  Both go through the
+manager's own methods, pointed at the same rows.
+
+    python bench/bench_columns.py --subscriptions 1000000
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from _common import make_subscriptions, timer
+from subscription_manager import SpendingColumns, SubscriptionManager, np
+
+
+def run(label: str, manager, count: int, start: datetime) -> list:
+    results = []
+    with timer(f"{label}: total_monthly_cost", count, "rows"):
+        results.append(SubscriptionManager.total_monthly_cost(manager))
+    for by in ("category", "currency"):
+        with timer(f"{label}: spending_breakdown({by})", count, "rows"):
+            results.append(SubscriptionManager.spending_breakdown(manager, by))
+    with timer(f"{label}: cash_flow_projection(12)", count, "rows"):
+        results.append(SubscriptionManager.cash_flow_projection(manager, 12, start))
+    return results
+
+
+def main(count: int) -> None:
+    if np is None:
+        sys.exit("numpy is not installed; the columnar path needs it")
+    subs = make_subscriptions(count)
+    start = datetime.now()
+
+    columns = SpendingColumns()
+    with timer(f"build columns for {count:,}", count, "rows"):
+        for sub in subs:
+            columns.add(sub)
+
+    loop = run("loop   ", SimpleNamespace(columns=None, subscriptions=subs), count, start)
+    columnar = run("columns", SimpleNamespace(columns=columns, subscriptions=subs), count, start)
+    if loop[:3] != columnar[:3]:
+        print("warning: loop and columnar results differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=1_000_000)
+    args = parser.parse_args()
+    main(args.subscriptions)
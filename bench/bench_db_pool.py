@@ -0,0 +1,120 @@
+"""/start and /api/sync database work for N concurrent users, before and after.
+
+"before" is the original bot.py access layer, reproduced below: a new
+connection per call, run synchronously on the event loop.  "after" is the
+pooled ``db`` module with the user cache and the write-behind sync path
+(``db.sync_subscriptions``, which the buffer's flusher batches further).
+
+    python bench/bench_db_pool.py --users 1000 --subs 20
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+
+from _common import db, fake_subscriptions, percentile, temp_database
+
+
+# ── The original access layer ───────────────────────────────────────────────
+def _legacy_connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def legacy_get_user(path: str, user_id: int) -> dict | None:
+    with _legacy_connect(path) as conn:
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+
+def legacy_upsert_user(path: str, user_id: int, **fields) -> None:
+    existing = legacy_get_user(path, user_id)
+    conn = _legacy_connect(path)
+    if existing:
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        conn.execute(f"UPDATE users SET {sets} WHERE user_id = ?", (*fields.values(), user_id))
+    else:
+        fields["user_id"] = user_id
+        cols = ", ".join(fields)
+        conn.execute(f"INSERT INTO users ({cols}) VALUES ({', '.join('?' * len(fields))})",
+                     tuple(fields.values()))
+    conn.commit()
+    conn.close()
+
+
+def legacy_sync(path: str, user_id: int, subs: list[dict]) -> None:
+    with _legacy_connect(path) as conn:
+        conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+        for s in subs:
+            conn.execute(
+                """INSERT INTO subscriptions
+                   (id, user_id, name, category, amount, currency,
+                    billing_cycle_type, billing_cycle_value,
+                    next_billing_date, billing_day, reminder_days, notes,
+                    is_free_trial, created_at)
+                   VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                (
+                    s["id"], user_id, s["name"], s["category"], float(s["amount"]), s["currency"],
+                    s["billing_cycle_type"], int(s.get("billing_cycle_value", 1)),
+                    s["next_billing_date"], 0, int(s.get("reminder_days", 3)),
+                    s.get("notes"), int(bool(s.get("is_free_trial", False))),
+                    s.get("created_at", datetime.utcnow().isoformat()),
+                ),
+            )
+        conn.commit()
+
+
+# ── One user's requests ─────────────────────────────────────────────────────
+async def legacy_session(path: str, user_id: int, subs: list[dict]) -> tuple[float, float]:
+    start = time.perf_counter()
+    legacy_upsert_user(path, user_id, first_name="Bench", last_name=None, username=f"u{user_id}")
+    legacy_get_user(path, user_id)          # photo_url
+    legacy_get_user(path, user_id)          # language
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    legacy_sync(path, user_id, subs)
+    await asyncio.sleep(0)
+    return started - start, time.perf_counter() - started
+
+
+async def pooled_session(user_id: int, subs: list[dict]) -> tuple[float, float]:
+    start = time.perf_counter()
+    await db.upsert_user(user_id, first_name="Bench", last_name=None, username=f"u{user_id}")
+    await db.get_user(user_id)
+    await db.get_user(user_id)
+    started = time.perf_counter()
+    await db.sync_subscriptions(user_id, subs)
+    return started - start, time.perf_counter() - started
+
+
+async def run(label: str, sessions) -> None:
+    start = time.perf_counter()
+    results = await asyncio.gather(*sessions)
+    elapsed = time.perf_counter() - start
+    start_lat = [r[0] for r in results]
+    sync_lat = [r[1] for r in results]
+    print(f"{label:<8} {len(results)} users in {elapsed:6.2f} s  "
+          f"({2 * len(results) / elapsed:8,.0f} req/s)  "
+          f"/start p50 {percentile(start_lat, 50) * 1000:7.1f} ms p99 {percentile(start_lat, 99) * 1000:7.1f} ms  "
+          f"/api/sync p50 {percentile(sync_lat, 50) * 1000:7.1f} ms p99 {percentile(sync_lat, 99) * 1000:7.1f} ms")
+
+
+async def main(users: int, subs_per_user: int) -> None:
+    subs = fake_subscriptions(subs_per_user)
+    with temp_database() as pool:
+        await db.init_db()
+        await run("before", [legacy_session(pool.path, uid, subs) for uid in range(users)])
+    with temp_database():
+        await db.init_db()
+        await run("after", [pooled_session(uid, subs) for uid in range(users)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="concurrent users")
+    parser.add_argument("--subs", type=int, default=20, help="subscriptions per sync")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.subs))
@@ -0,0 +1,87 @@
+"""Load test of the reminder dispatcher against a fake Bot API server.
+
+Sends N reminders spread over C chats through ``ReminderDispatcher`` and a
+real aiogram ``Bot`` pointed at ``_fake_bot_api.FakeBotAPI``, which enforces
+Telegram's global and per-chat limits with 429 / ``retry_after``.  Reports
+throughput, how often the server had to refuse, and the peak rate it saw.
+
+    python bench/bench_dispatcher.py --reminders 1000 --chats 200
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import date
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from _common import db, fake_subscriptions, temp_database
+from _fake_bot_api import TOKEN, FakeBotAPI
+from db import DueSubscription, to_epoch_day
+from dispatcher import ReminderDispatcher
+from reminder_text import render_reminder
+
+
+def make_reminders(count: int, chats: int) -> list[DueSubscription]:
+    rng = random.Random(4)
+    rows = []
+    for sub in fake_subscriptions(count, within_days=8):
+        batch, _ = db.validate_subscriptions(rng.randrange(1, chats + 1), [sub])
+        rows.append(DueSubscription(
+            batch.user_id, sub["id"], sub["name"], sub["amount"], sub["currency"],
+            batch.billing_dates[0], batch.billing_days[0], sub["reminder_days"],
+            int(sub["is_free_trial"]), "en", None,
+        ))
+    return rows
+
+
+async def main(args) -> None:
+    server = FakeBotAPI(rate=args.server_rate, latency=args.latency)
+    base_url = await server.start()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+
+    async def send(sub: DueSubscription, offset: int, today: int) -> None:
+        await bot.send_message(chat_id=sub.user_id, text=render_reminder(sub, today), parse_mode="HTML")
+
+    reminders = make_reminders(args.reminders, args.chats)
+    today = to_epoch_day(date.today())
+    dispatcher = ReminderDispatcher(
+        send, workers=args.workers, rate=args.rate,
+        permanent_errors=(TelegramForbiddenError, TelegramBadRequest),
+    )
+    try:
+        with temp_database():
+            await db.init_db()
+            dispatcher.start()
+            start = time.perf_counter()
+            for sub in reminders:
+                await dispatcher.submit(sub, 0, today)
+            # Retries wait outside the queue, so join() alone can return early.
+            while dispatcher.sent + dispatcher.failed < len(reminders):
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            await dispatcher.stop()
+    finally:
+        await bot.session.close()
+        await server.stop()
+
+    print(f"{len(reminders):,} reminders to {args.chats:,} chats in {elapsed:.1f} s "
+          f"({dispatcher.sent / elapsed:.1f} msg/s, limit {args.server_rate:g}/s)")
+    print(f"sent {dispatcher.sent:,}  dead-lettered {dispatcher.failed:,}  retried {dispatcher.retried:,}")
+    print(f"server: 429 over the global limit {server.global_refusals:,}, per chat "
+          f"{server.chat_refusals:,}; peak {server.peak_rate} msg in any 1 s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reminders", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=30.0, help="dispatcher's messages/second")
+    parser.add_argument("--server-rate", type=float, default=30.0, help="fake server's messages/second")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API call")
+    asyncio.run(main(parser.parse_args()))
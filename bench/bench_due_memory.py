@@ -0,0 +1,88 @@
+"""Memory used to walk the reminder window over a large subscriptions table.
+
+Loads N subscriptions (all billing within the horizon), then measures with
+tracemalloc the peak Python allocation of
+
+* materialising every due row at once, as the original scheduler did,
+* streaming them through ``db.iter_due_subscriptions``, and
+* ``ReminderScheduler.rebuild``, which only keeps today's reminder keys.
+
+    python bench/bench_due_memory.py --subscriptions 1000000
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from _common import db, fake_subscriptions, temp_database
+from scheduler import REMINDER_HORIZON_DAYS, ReminderScheduler
+
+PER_USER = 10
+
+
+def _add_users(conn, user_ids: list[int]) -> None:
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (user_id, language) VALUES (?, 'en')",
+                         [(user_id,) for user_id in user_ids])
+
+
+async def load(count: int) -> None:
+    users = count // PER_USER
+    await db.pool.run(_add_users, list(range(users)))
+    chunk = 1000
+    for first in range(0, users, chunk):
+        batches = []
+        for user_id in range(first, min(users, first + chunk)):
+            subs = fake_subscriptions(PER_USER, seed=user_id, within_days=REMINDER_HORIZON_DAYS)
+            batches.append(db.validate_subscriptions(user_id, subs))
+        await db.sync_many(batches)
+
+
+async def measure(label: str, coro) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {result:>10,}  peak {peak / 2**20:9.1f} MiB  {elapsed:7.2f} s")
+
+
+async def materialise() -> int:
+    rows = [sub async for sub in db.iter_due_subscriptions(within_days=REMINDER_HORIZON_DAYS)]
+    return len(rows)
+
+
+async def stream() -> int:
+    count = 0
+    async for _ in db.iter_due_subscriptions(within_days=REMINDER_HORIZON_DAYS):
+        count += 1
+    return count
+
+
+async def rebuild() -> int:
+    async def send(sub, offset, today) -> None:
+        pass
+
+    scheduler = ReminderScheduler(send)
+    await scheduler.rebuild()
+    return len(scheduler)
+
+
+async def main(count: int) -> None:
+    with temp_database():
+        await db.init_db()
+        start = time.perf_counter()
+        await load(count)
+        print(f"loaded {count:,} subscriptions in {time.perf_counter() - start:.1f} s")
+        await measure("materialise all due rows", materialise())
+        await measure("stream due rows", stream())
+        await measure("scheduler rebuild (keys)", rebuild())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.subscriptions))
@@ -0,0 +1,48 @@
+"""Full-list sync ingest at several payload sizes.
+
+Times validation alone and the whole ``db.sync_subscriptions`` call (validate,
+diff and ``executemany`` in one transaction), for a first sync and for a
+repeat sync in which a tenth of the rows changed.
+
+    python bench/bench_ingest.py --sizes 10 100 10000
+"""
+
+import argparse
+import asyncio
+import time
+
+from _common import db, fake_subscriptions, report, temp_database
+
+
+async def main(sizes: list[int], repeat: int) -> None:
+    with temp_database():
+        await db.init_db()
+        for size in sizes:
+            subs = fake_subscriptions(size)
+            changed = [dict(s, amount=s["amount"] + 1) if i % 10 == 0 else s for i, s in enumerate(subs)]
+            rounds = max(1, repeat * 100 // max(size, 100))
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                db.validate_subscriptions(1, subs)
+            report(f"{size:>6} rows  validate", (time.perf_counter() - start) / rounds, size, "rows")
+
+            first = resync = 0.0
+            for r in range(rounds):
+                user_id = size * 1000 + r
+                start = time.perf_counter()
+                await db.sync_subscriptions(user_id, subs)
+                first += time.perf_counter() - start
+                start = time.perf_counter()
+                await db.sync_subscriptions(user_id, changed)
+                resync += time.perf_counter() - start
+            report(f"{size:>6} rows  first sync", first / rounds, size, "rows")
+            report(f"{size:>6} rows  re-sync, 10% changed", resync / rounds, size, "rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=20, help="rounds for the 100-row size; scaled for others")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
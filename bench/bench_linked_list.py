@@ -0,0 +1,131 @@
+"""SubscriptionLinkedList: bulk load, then a mixed stream of edits.
+
+The mix is 40% lookups, 30% updates, 20% removals and 10% inserts after a
+random node.  "before" is the original singly linked list without the id
+index, whose every operation walks the list, so it is run on a much smaller
+list (``--legacy-size``); compare the per-operation figures.
+
+    python bench/bench_linked_list.py --size 1000000 --ops 100000
+"""
+
+import argparse
+import random
+from dataclasses import replace
+
+from _common import make_subscriptions, timer
+from subscription_manager import SubscriptionLinkedList
+
+
+class LegacyLinkedList:
+    """The original list: head pointer only, linear scans."""
+
+    class _Node:
+        def __init__(self, value) -> None:
+            self.value = value
+            self.next = None
+
+    def __init__(self) -> None:
+        self.head = None
+
+    def _find_node(self, sub_id: str):
+        current = self.head
+        while current is not None and current.value.id != sub_id:
+            current = current.next
+        return current
+
+    def find_by_id(self, sub_id: str):
+        node = self._find_node(sub_id)
+        return node.value if node else None
+
+    def update(self, sub_id: str, updater) -> bool:
+        node = self._find_node(sub_id)
+        if node is None:
+            return False
+        node.value = updater(node.value)
+        return True
+
+    def insert_after(self, prev_id: str, value) -> None:
+        prev = self._find_node(prev_id)
+        node = self._Node(value)
+        node.next, prev.next = prev.next, node
+
+    def remove_by_id(self, sub_id: str):
+        current, previous = self.head, None
+        while current is not None:
+            if current.value.id == sub_id:
+                if previous is None:
+                    self.head = current.next
+                else:
+                    previous.next = current.next
+                return current.value
+            previous, current = current, current.next
+        return None
+
+
+def mixed_ops(ids: list[str], extra: list, count: int, seed: int = 2) -> list[tuple]:
+    rng = random.Random(seed)
+    live = list(ids)
+    extra = iter(extra)
+    ops = []
+    for _ in range(count):
+        roll = rng.random()
+        i = rng.randrange(len(live))
+        if roll < 0.4:
+            ops.append(("find", live[i]))
+        elif roll < 0.7:
+            ops.append(("update", live[i]))
+        elif roll < 0.9 and len(live) > 1:
+            live[i], live[-1] = live[-1], live[i]
+            ops.append(("remove", live.pop()))
+        else:
+            sub = next(extra)
+            ops.append(("insert", live[i], sub))
+            live.append(sub.id)
+    return ops
+
+
+def _bump(sub):
+    return replace(sub, price=sub.price + 1)
+
+
+def run(label: str, linked, subs: list, extra: list, count: int) -> None:
+    if isinstance(linked, SubscriptionLinkedList):
+        with timer(f"{label}: append {len(subs):,}", len(subs)):
+            for sub in subs:
+                linked.append(sub)
+    else:
+        # Appending one by one to the legacy list is quadratic; link it up
+        # front, untimed.
+        for sub in reversed(subs):
+            node = linked._Node(sub)
+            node.next, linked.head = linked.head, node
+
+    ops = mixed_ops([s.id for s in subs], extra, count)
+    with timer(f"{label}: {count:,} edits on {len(subs):,}", count):
+        for op in ops:
+            kind = op[0]
+            if kind == "find":
+                linked.find_by_id(op[1])
+            elif kind == "update":
+                linked.update(op[1], _bump)
+            elif kind == "remove":
+                linked.remove_by_id(op[1])
+            else:
+                linked.insert_after(op[1], op[2])
+
+
+def main(size: int, ops: int, legacy_size: int, legacy_ops: int) -> None:
+    subs = make_subscriptions(max(size, legacy_size) + max(ops, legacy_ops))
+    if legacy_size:
+        run("before", LegacyLinkedList(), subs[:legacy_size], subs[-legacy_ops:], legacy_ops)
+    run("after ", SubscriptionLinkedList(), subs[:size], subs[-ops:], ops)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=100_000)
+    parser.add_argument("--legacy-size", type=int, default=10_000, help="0 to skip the original list")
+    parser.add_argument("--legacy-ops", type=int, default=2_000)
+    args = parser.parse_args()
+    main(args.size, args.ops, args.legacy_size, args.legacy_ops)
@@ -0,0 +1,84 @@
+"""Bytes per subscription, measured with tracemalloc.
+
+Compares the original ``@dataclass`` Subscription (instance ``__dict__``,
+no string interning) with the slotted, frozen one, on its own and held in a
+``SubscriptionLinkedList``, and reports what a fully indexed
+``SubscriptionManager`` costs per row.
+
+    python bench/bench_memory.py --subscriptions 100000
+"""
+
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+from _common import make_subscriptions
+from subscription_manager import Subscription, SubscriptionLinkedList, SubscriptionManager
+
+
+@dataclass
+class LegacySubscription:
+    id: str
+    name: str
+    category: str
+    price: float
+    renewal_date: datetime
+    billing_cycle: str = "monthly"
+    reminder_days_before: int = 3
+    cancelled: bool = False
+    currency: str = "USD"
+    billing_cycle_value: int = 1
+
+
+def _fresh(value):
+    # Copies of the strings, as they would arrive from JSON or the database,
+    # so interning (or its absence) is part of the measurement.
+    return "".join(value) if isinstance(value, str) else value
+
+
+def measure(label: str, count: int, build) -> None:
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = build()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<40} {(after - before) / count:8.0f} bytes/subscription")
+    del kept
+
+
+def main(count: int, manager_count: int) -> None:
+    templates = make_subscriptions(count)
+    raw = [{f.name: getattr(sub, f.name) for f in fields(Subscription)} for sub in templates]
+
+    def objects(cls, n: int = count):
+        return [cls(**{k: _fresh(v) for k, v in row.items()}) for row in raw[:n]]
+
+    def linked(cls):
+        items = SubscriptionLinkedList()
+        for sub in objects(cls):
+            items.append(sub)
+        return items
+
+    measure("before: dataclass objects", count, lambda: objects(LegacySubscription))
+    measure("after:  slotted objects", count, lambda: objects(Subscription))
+    measure("before: dataclass in linked list", count, lambda: linked(LegacySubscription))
+    measure("after:  slotted in linked list", count, lambda: linked(Subscription))
+
+    def manager():
+        m = SubscriptionManager()
+        m.add_many(objects(Subscription, manager_count))
+        return m
+
+    measure("after:  SubscriptionManager, all indexes", manager_count, manager)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--manager-subscriptions", type=int, default=20_000)
+    args = parser.parse_args()
+    main(args.subscriptions, min(args.subscriptions, args.manager_subscriptions))
@@ -0,0 +1,73 @@
+"""Rendering N reminder messages, before and after the compiled templates.
+
+"before" is the original ``_format_reminder`` (per call: date parsing,
+strftime, amount formatting and a title join), run over the same rows as
+dicts.  "after" is ``reminder_text.render_reminder`` over ``DueSubscription``
+tuples with ``today`` computed once for the batch.
+
+    python bench/bench_render.py --reminders 100000
+"""
+
+import argparse
+import random
+from datetime import date
+
+from _common import db, fake_subscriptions, timer
+from db import DueSubscription, to_epoch_day
+from reminder_text import (REMINDER_TRANSLATIONS, format_amount, format_date, format_days,
+                           render_reminder)
+
+LANGUAGES = ("en", "ru", "uz")
+
+
+def legacy_format_reminder(sub: dict, lang: str) -> str:
+    msgs  = REMINDER_TRANSLATIONS.get(lang, REMINDER_TRANSLATIONS["en"])
+    today = date.today()
+    due   = date.fromisoformat(sub["next_billing_date"])
+    days  = (due - today).days
+    is_trial = bool(sub.get("is_free_trial"))
+
+    fmt_date   = due.strftime("%-d %b")
+    fmt_amount = f"{sub['amount']:.2f}".rstrip("0").rstrip(".")
+    s          = "" if days == 1 else "s"
+
+    if days == 0:
+        template = msgs["trial_today"] if is_trial else msgs["today"]
+        body = template.format(name=sub["name"], amount=fmt_amount, currency=sub["currency"])
+    else:
+        template = msgs["trial"] if is_trial else msgs["body"]
+        body = template.format(name=sub["name"], days=days, s=s, date=fmt_date,
+                               amount=fmt_amount, currency=sub["currency"])
+    return f"{msgs['title']}\n\n{body}"
+
+
+def main(count: int) -> None:
+    rng = random.Random(1)
+    subs = fake_subscriptions(count, within_days=8)
+    rows = []
+    for sub in subs:
+        batch, _ = db.validate_subscriptions(rng.randrange(10_000), [sub])
+        rows.append(DueSubscription(
+            batch.user_id, sub["id"], sub["name"], sub["amount"], sub["currency"],
+            batch.billing_dates[0], batch.billing_days[0], sub["reminder_days"],
+            int(sub["is_free_trial"]), rng.choice(LANGUAGES), None,
+        ))
+
+    with timer(f"before: _format_reminder x {count:,}", count, "msgs"):
+        for sub, row in zip(subs, rows):
+            legacy_format_reminder(sub, row.language)
+
+    # Start from cold caches so their fill is part of the measurement.
+    for cached in (format_amount, format_date, format_days):
+        cached.cache_clear()
+    with timer(f"after:  render_reminder x {count:,}", count, "msgs"):
+        today = to_epoch_day(date.today())
+        for row in rows:
+            render_reminder(row, today)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reminders", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.reminders)
@@ -0,0 +1,67 @@
+"""Name search over N subscriptions: trigram index against a linear scan.
+
+"before" is the original ``search_by_name`` (lower-cased substring test on
+every name).  "after" builds a ``NameSearchIndex`` and runs substring,
+prefix and typo-tolerant queries against it.
+
+    python bench/bench_search.py --names 500000
+"""
+
+import argparse
+import random
+import time
+
+from _common import SERVICES, report, timer
+from subscription_manager import NameSearchIndex
+
+PLANS = ("Basic", "Standard", "Premium", "Family", "Student", "Duo", "Pro", "Team", "Plus", "Семейный")
+
+# Broad queries match a large share of the names, so both sides spend most
+# of their time collecting results; narrow ones show the index's lookup cost.
+BROAD = ("flix", "premium", "yandex plus", "семей")
+NARROW = ("netflix duo 42", "spotify family 7", "headspace pro 999", "adobe cc team 12")
+PREFIX = ("sp", "goog", "tele", "a")
+FUZZY = ("netflx", "spotfy premum", "yutube", "dropbx family")
+
+
+def make_names(count: int, seed: int = 3) -> dict[str, str]:
+    rng = random.Random(seed)
+    return {f"sub-{i}": f"{rng.choice(SERVICES)} {rng.choice(PLANS)} {rng.randrange(1000)}"
+            for i in range(count)}
+
+
+def timed_queries(label: str, fn, queries, rounds: int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    count = rounds * len(queries)
+    report(f"{label} ({count} queries)", (time.perf_counter() - start) / count, 1, "queries")
+
+
+def main(count: int, rounds: int) -> None:
+    names = make_names(count)
+
+    def linear(query: str) -> list[str]:
+        text = query.lower().strip()
+        return [sub_id for sub_id, name in names.items() if text in name.lower()]
+
+    timed_queries("before: linear, broad", linear, BROAD, max(1, rounds // 5))
+    timed_queries("before: linear, narrow", linear, NARROW, max(1, rounds // 5))
+
+    index = NameSearchIndex()
+    with timer(f"after:  index {count:,} names", count, "names"):
+        for sub_id, name in names.items():
+            index.add(sub_id, name)
+    timed_queries("after:  substring, broad", index.substring, BROAD, rounds)
+    timed_queries("after:  substring, narrow", index.substring, NARROW, rounds)
+    timed_queries("after:  prefix", index.prefix, PREFIX, rounds)
+    timed_queries("after:  fuzzy", index.fuzzy, FUZZY, rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=500_000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    main(args.names, args.rounds)
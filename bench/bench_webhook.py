@@ -0,0 +1,120 @@
+"""Update latency in webhook mode against long polling.
+
+Feeds N text messages at a fixed rate to an aiogram ``Dispatcher`` whose only
+handler records how long each update took from injection to handling:
+
+* polling: updates are queued on ``_fake_bot_api.FakeBotAPI`` and fetched by
+  ``Dispatcher.start_polling`` through ``getUpdates`` long polls;
+* webhook: updates are POSTed to ``WebhookIngress.handle`` on a local aiohttp
+  app, as Telegram would.
+
+    python bench/bench_webhook.py --updates 2000 --rate 200
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import web
+
+from _common import percentile
+from _fake_bot_api import TOKEN, FakeBotAPI, make_update
+from webhook import SECRET_HEADER, WebhookIngress
+
+SECRET = "bench-secret"
+
+
+def make_dispatcher(latencies: list[float], done: asyncio.Event, total: int) -> Dispatcher:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def on_message(message: Message) -> None:
+        latencies.append(time.perf_counter() - float(message.text))
+        if len(latencies) == total:
+            done.set()
+
+    return dp
+
+
+async def inject(count: int, rate: float, push) -> None:
+    start = time.perf_counter()
+    for i in range(count):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await push(make_update(i + 1, 1000 + i % 100, repr(time.perf_counter())))
+
+
+async def run_polling(bot: Bot, server: FakeBotAPI, count: int, rate: float) -> list[float]:
+    latencies: list[float] = []
+    done = asyncio.Event()
+    dp = make_dispatcher(latencies, done, count)
+
+    async def push(update: dict) -> None:
+        server.push_update(update)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await inject(count, rate, push)
+    await done.wait()
+    await dp.stop_polling()
+    await asyncio.gather(polling, return_exceptions=True)
+    return latencies
+
+
+async def run_webhook(bot: Bot, count: int, rate: float) -> list[float]:
+    latencies: list[float] = []
+    done = asyncio.Event()
+    ingress = WebhookIngress(make_dispatcher(latencies, done, count), bot, SECRET)
+    app = web.Application()
+    app.router.add_post("/webhook", ingress.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    ingress.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async def push(update: dict) -> None:
+                async with session.post(f"http://{host}:{port}/webhook", json=update,
+                                        headers={SECRET_HEADER: SECRET}) as response:
+                    response.raise_for_status()
+
+            await inject(count, rate, push)
+            await done.wait()
+    finally:
+        await ingress.stop()
+        await runner.cleanup()
+    return latencies
+
+
+def show(label: str, latencies: list[float]) -> None:
+    print(f"{label:<8} {len(latencies):,} updates  "
+          f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+          f"max {max(latencies) * 1000:7.2f} ms")
+
+
+async def main(count: int, rate: float) -> None:
+    server = FakeBotAPI()
+    base_url = await server.start()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+    try:
+        show("polling", await run_polling(bot, server, count, rate))
+        show("webhook", await run_webhook(bot, count, rate))
+    finally:
+        await bot.session.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200.0, help="updates per second")
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.rate))
@@ -1,17 +1,35 @@
 import os
+import gzip
+import hashlib
+import hmac
 import json
 import logging
+import time
 import urllib.parse
-import sqlite3
-from datetime import date, datetime, timedelta
 from aiohttp import web
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 import asyncio
 
+try:
+    import brotli
+except ImportError:  # responses are gzip-compressed only
+    brotli = None
+
+import db
+from dispatcher import ReminderDispatcher
+from manager_store import manager_store
+from metrics import SIZE_BUCKETS, registry
+from profiling import LoopWatchdog, SamplingProfiler
+from reminder_text import render_reminder
+from scheduler import ReminderScheduler
+from sync_buffer import SyncBuffer
+from webhook import WebhookIngress
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -22,72 +40,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ── SQLite persistence ────────────────────────────────────────────────────────
-DB_PATH = os.getenv("DB_PATH", "yodda_users.db")
-
-def _db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db() -> None:
-    with _db() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id     INTEGER PRIMARY KEY,
-                language    TEXT,
-                phone       TEXT,
-                first_name  TEXT,
-                last_name   TEXT,
-                username    TEXT,
-                photo_url   TEXT,
-                group_msg_id INTEGER
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS subscriptions (
-                id                  TEXT    NOT NULL,
-                user_id             INTEGER NOT NULL,
-                name                TEXT    NOT NULL,
-                category            TEXT    NOT NULL,
-                amount              REAL    NOT NULL,
-                currency            TEXT    NOT NULL,
-                billing_cycle_type  TEXT    NOT NULL,
-                billing_cycle_value INTEGER NOT NULL DEFAULT 1,
-                next_billing_date   TEXT    NOT NULL,
-                reminder_days       INTEGER NOT NULL DEFAULT 3,
-                notes               TEXT,
-                is_free_trial       INTEGER NOT NULL DEFAULT 0,
-                created_at          TEXT    NOT NULL,
-                PRIMARY KEY (id, user_id),
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        conn.commit()
-
-def get_user(user_id: int) -> dict | None:
-    with _db() as conn:
-        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
-        return dict(row) if row else None
-
-def upsert_user(user_id: int, **fields) -> None:
-    existing = get_user(user_id)
-    if existing:
-        sets = ", ".join(f"{k} = ?" for k in fields)
-        conn = _db()
-        conn.execute(f"UPDATE users SET {sets} WHERE user_id = ?", (*fields.values(), user_id))
-        conn.commit()
-        conn.close()
-    else:
-        fields["user_id"] = user_id
-        cols = ", ".join(fields.keys())
-        placeholders = ", ".join("?" * len(fields))
-        conn = _db()
-        conn.execute(f"INSERT INTO users ({cols}) VALUES ({placeholders})", tuple(fields.values()))
-        conn.commit()
-        conn.close()
-# ─────────────────────────────────────────────────────────────────────────────
-
 # Get bot token from environment variable
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 GROUP_ID_STR = os.getenv('GROUP_ID')  # Optional: Telegram group/channel ID
@@ -109,6 +61,26 @@ bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
+HANDLER_SECONDS = registry.histogram(
+    "yodda_handler_seconds",
+    "Time spent in each aiogram handler",
+    ("handler",),
+)
+
+
+async def _time_handler(handler, event, data):
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+dp.message.middleware(_time_handler)
+dp.callback_query.middleware(_time_handler)
+
 TRANSLATIONS = {
     "en": {
         "start": "Welcome! Choose your language to get started.",
@@ -139,60 +111,259 @@ TRANSLATIONS = {
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "en")
 
 # ── In-memory helpers that delegate to SQLite ─────────────────────────────────
-def _get_field(user_id: int, field: str):
-    row = get_user(user_id)
+async def _get_field(user_id: int, field: str):
+    row = await db.get_user(user_id)
     return row[field] if row else None
 
-def _set_field(user_id: int, **fields) -> None:
-    upsert_user(user_id, **fields)
-# ─────────────────────────────────────────────────────────────────────────────
-
-
-# ── Subscription helpers ──────────────────────────────────────────────────────
-def sync_subscriptions(user_id: int, subs: list[dict]) -> None:
-    """Replace all subscriptions for a user with the provided list (full sync)."""
-    with _db() as conn:
-        conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
-        for s in subs:
-            conn.execute(
-                """INSERT INTO subscriptions
-                   (id, user_id, name, category, amount, currency,
-                    billing_cycle_type, billing_cycle_value,
-                    next_billing_date, reminder_days, notes,
-                    is_free_trial, created_at)
-                   VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                (
-                    s["id"], user_id, s["name"], s["category"],
-                    float(s["amount"]), s["currency"],
-                    s["billing_cycle_type"], int(s.get("billing_cycle_value", 1)),
-                    s["next_billing_date"], int(s.get("reminder_days", 3)),
-                    s.get("notes"), int(bool(s.get("is_free_trial", False))),
-                    s.get("created_at", datetime.utcnow().isoformat()),
-                ),
-            )
-        conn.commit()
-
-
-def get_due_subscriptions(within_days: int = 7) -> list[dict]:
-    """Return all subscriptions whose next_billing_date falls within the next N days."""
-    today = date.today()
-    cutoff = today + timedelta(days=within_days)
-    with _db() as conn:
-        rows = conn.execute(
-            """SELECT s.*, u.language
-               FROM subscriptions s
-               JOIN users u ON s.user_id = u.user_id
-               WHERE s.next_billing_date BETWEEN ? AND ?
-               ORDER BY s.next_billing_date ASC""",
-            (today.isoformat(), cutoff.isoformat()),
-        ).fetchall()
-    return [dict(r) for r in rows]
+async def _set_field(user_id: int, **fields) -> None:
+    await db.upsert_user(user_id, **fields)
 # ─────────────────────────────────────────────────────────────────────────────
 
 
 # ── HTTP Sync API (aiohttp) ───────────────────────────────────────────────────
 API_PORT = int(os.getenv("API_PORT", "8080"))
 API_SECRET = os.getenv("API_SECRET", "")   # optional bearer token for security
+# Bearer token for /metrics and /admin/*.  Kept apart from API_SECRET, which
+# ships inside the mini app bundle; without it those endpoints are refused.
+ADMIN_SECRET = os.getenv("ADMIN_SECRET", "")
+# How long a mini app launch's signed initData is accepted, in seconds.
+WEBAPP_AUTH_MAX_AGE = int(os.getenv("WEBAPP_AUTH_MAX_AGE", "86400"))
+
+# Webhook mode: set WEBHOOK_URL to the public base URL of this server and
+# Telegram will POST updates to WEBHOOK_URL + WEBHOOK_PATH instead of the bot
+# long-polling.  Leave it unset to keep polling.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+webhook_ingress = WebhookIngress(dp, bot, WEBHOOK_SECRET)
+
+HTTP_SECONDS = registry.histogram(
+    "yodda_http_request_seconds",
+    "Latency of requests to the aiohttp app, by route and status",
+    ("method", "route", "status"),
+)
+SYNC_PAYLOAD_BYTES = registry.histogram(
+    "yodda_sync_payload_bytes",
+    "Size of /api/sync request bodies",
+    buckets=SIZE_BUCKETS,
+)
+
+
+@web.middleware
+async def _metrics_middleware(request: web.Request, handler) -> web.StreamResponse:
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, request.method, route, str(status))
+
+
+loop_watchdog = LoopWatchdog()
+profiler = SamplingProfiler()
+
+
+async def handle_profile(request: web.Request) -> web.Response:
+    """
+    POST /admin/profile?seconds=10
+    Headers: Authorization: Bearer <ADMIN_SECRET>   (disabled without ADMIN_SECRET)
+
+    Samples every thread's stack for the given number of seconds and writes a
+    collapsed-stack file for flamegraph tools.  Responds with its path once
+    the profile is done.
+    """
+    denied = _admin_denied(request)
+    if denied:
+        return denied
+
+    try:
+        seconds = float(request.query.get("seconds", "10"))
+    except ValueError:
+        seconds = 0
+    if not seconds > 0:   # also rejects NaN
+        return web.json_response({"error": "seconds must be a positive number"}, status=422)
+    if profiler.running:
+        return web.json_response({"error": "A profile is already running"}, status=409)
+
+    try:
+        path, samples = await asyncio.to_thread(profiler.profile, seconds)
+    except RuntimeError:
+        return web.json_response({"error": "A profile is already running"}, status=409)
+    logger.info(f"🔥 Profile written to {path} ({samples} samples)")
+    return web.json_response({"ok": True, "file": path, "samples": samples})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """GET /metrics — Prometheus text format (bearer ADMIN_SECRET; disabled without it)."""
+    denied = _admin_denied(request)
+    if denied:
+        return denied
+    return web.Response(
+        body=registry.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+def _unauthorized(request: web.Request) -> web.Response | None:
+    """Return a 401 response if API_SECRET is set and the bearer token is wrong."""
+    if API_SECRET:
+        auth = request.headers.get("Authorization", "")
+        if auth != f"Bearer {API_SECRET}":
+            return web.json_response({"error": "Unauthorized"}, status=401)
+    return None
+
+
+def _admin_denied(request: web.Request) -> web.Response | None:
+    """Return an error response unless the request carries ADMIN_SECRET."""
+    if not ADMIN_SECRET:
+        return web.json_response({"error": "Admin endpoints need ADMIN_SECRET to be set"}, status=403)
+    auth = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth.encode(), f"Bearer {ADMIN_SECRET}".encode()):
+        return web.json_response({"error": "Unauthorized"}, status=401)
+    return None
+
+
+def _webapp_user_id(request: web.Request) -> int | None:
+    """The user id from a verified ``Authorization: tma <initData>`` header, else None.
+
+    initData is signed by Telegram with a key derived from the bot token, so
+    unlike API_SECRET it cannot be used to act as some other user.
+    """
+    scheme, _, init_data = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "tma" or not init_data or not BOT_TOKEN:
+        return None
+    fields = dict(urllib.parse.parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        return None
+    try:
+        if time.time() - int(fields.get("auth_date", "0")) > WEBAPP_AUTH_MAX_AGE:
+            return None
+        user_id = json.loads(fields.get("user", "{}")).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return user_id if isinstance(user_id, int) and not isinstance(user_id, bool) else None
+
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _parse_if_match(request: web.Request) -> int | None:
+    """Read a sync version from an If-Match header like ``"12"``, if present."""
+    raw = request.headers.get("If-Match", "").strip()
+    if raw.startswith("W/"):
+        raw = raw[2:]
+    raw = raw.strip('"')
+    return int(raw) if raw.isdigit() else None
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    """True if If-None-Match lists ``etag`` (or ``*``)."""
+    raw = request.headers.get("If-None-Match")
+    if not raw:
+        return False
+    tags = [t.strip() for t in raw.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# Bodies smaller than this are sent uncompressed.
+COMPRESS_MIN_SIZE = 512
+
+
+def _accepted_encodings(request: web.Request) -> set[str]:
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in {"0", "0.0", "0.00", "0.000"}:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _compressed_json(request: web.Request, payload, status: int = 200, headers: dict | None = None) -> web.Response:
+    """A JSON response, brotli- or gzip-encoded if the client accepts it."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    if len(body) >= COMPRESS_MIN_SIZE:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return web.Response(body=body, status=status, content_type="application/json", headers=headers)
+
+
+def _subscription_json(row: tuple) -> dict:
+    """A ``db._SELECT_USER_ROWS`` row in the mini app's Subscription shape."""
+    (sub_id, name, category, amount, currency, cycle_type, cycle_value,
+     billing_date, reminder_days, notes, is_free_trial, created_at) = row
+    sub = {
+        "id": sub_id,
+        "name": name,
+        "category": category,
+        "amount": amount,
+        "currency": currency,
+        "billing_cycle_type": cycle_type,
+        "billing_cycle_value": cycle_value,
+        "next_billing_date": billing_date,
+        "reminder_days": reminder_days,
+        "is_free_trial": bool(is_free_trial),
+        "created_at": created_at,
+    }
+    if notes is not None:
+        sub["notes"] = notes
+    return sub
+
+
+async def handle_get_subscriptions(request: web.Request) -> web.Response:
+    """
+    GET /api/subscriptions
+    Headers: Authorization: tma <Telegram.WebApp.initData>
+             If-None-Match: "<version>"            (optional)
+
+    Returns the signed-in user's stored subscriptions with their sync version
+    as a strong ETag.  The user comes from the verified initData, never from
+    the request, so one user cannot read another's list.  If the client
+    already has that version the response is an empty 304 and the rows are
+    not read at all.
+    """
+    user_id = _webapp_user_id(request)
+    if user_id is None:
+        return web.json_response({"error": "Unauthorized"}, status=401)
+    cache_headers = {"Cache-Control": "private, no-cache"}
+
+    try:
+        # Read back the user's own queued sync, not the rows it will replace.
+        await sync_buffer.flush(user_id)
+        version = await db.get_sync_version(user_id)
+        if _etag_matches(request, _etag(version)):
+            return web.Response(status=304, headers={"ETag": _etag(version), **cache_headers})
+        version, rows = await db.load_user_subscriptions(user_id)
+    except Exception as e:
+        logger.error(f"Loading subscriptions failed for user {user_id}: {e}")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+    return _compressed_json(
+        request,
+        {"version": version, "subscriptions": [_subscription_json(row) for row in rows]},
+        headers={"ETag": _etag(version), **cache_headers},
+    )
 
 
 async def handle_sync(request: web.Request) -> web.Response:
@@ -201,16 +372,23 @@ async def handle_sync(request: web.Request) -> web.Response:
     Headers: Authorization: Bearer <API_SECRET>   (if API_SECRET is set)
     Body (JSON):
         { "user_id": 123456789, "subscriptions": [ ...Subscription objects... ] }
+
+    The list is validated and queued, and the request is answered with 202
+    straight away; a background flusher writes queued lists in batches (see
+    sync_buffer.py).  A newer list for the same user replaces a queued one.
+    Malformed rows are skipped and listed under "rejected" with their index
+    and reason.
     """
     # ── Auth ──────────────────────────────────────────────────────────────────
-    if API_SECRET:
-        auth = request.headers.get("Authorization", "")
-        if auth != f"Bearer {API_SECRET}":
-            return web.json_response({"error": "Unauthorized"}, status=401)
+    denied = _unauthorized(request)
+    if denied:
+        return denied
 
     # ── Parse body ────────────────────────────────────────────────────────────
     try:
-        body = await request.json()
+        raw = await request.read()
+        SYNC_PAYLOAD_BYTES.observe(len(raw))
+        body = json.loads(raw)
     except Exception:
         return web.json_response({"error": "Invalid JSON"}, status=400)
 
@@ -220,20 +398,101 @@ async def handle_sync(request: web.Request) -> web.Response:
     if not isinstance(user_id, int) or not isinstance(subs, list):
         return web.json_response({"error": "user_id (int) and subscriptions (list) are required"}, status=422)
 
-    # ── Persist ───────────────────────────────────────────────────────────────
+    # ── Queue ─────────────────────────────────────────────────────────────────
+    try:
+        rejected = await sync_buffer.submit(user_id, subs)
+    except Exception as e:
+        logger.error(f"Queueing sync failed for user {user_id}: {e}")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+    synced = len(subs) - len(rejected)
+    return web.json_response(
+        {"ok": True, "queued": True, "synced": synced, "rejected": rejected},
+        status=202,
+    )
+
+
+async def _on_sync_committed(user_id: int, result: dict) -> None:
+    if result["upserted"] or result["deleted"]:
+        manager_store.invalidate(user_id)
+        await reminder_scheduler.reschedule_user(user_id)
+    logger.info(
+        f"✅ Synced subscriptions for user {user_id} (version {result['version']}: "
+        f"{result['upserted']} written, {result['deleted']} deleted, {len(result['rejected'])} rejected)"
+    )
+
+
+sync_buffer = SyncBuffer(_on_sync_committed)
+
+
+async def handle_sync_delta(request: web.Request) -> web.Response:
+    """
+    POST /api/sync/delta
+    Headers: Authorization: Bearer <API_SECRET>   (if API_SECRET is set)
+             If-Match: "<version>"                 (optional, or base_version in body)
+    Body (JSON):
+        { "user_id": 123456789, "base_version": 4,
+          "upserts": [ ...Subscription objects... ], "deletes": [ "<id>", ... ] }
+
+    Only the listed rows are touched.  If the client's base version is stale
+    the request is rejected with 409 and the current version.
+    """
+    denied = _unauthorized(request)
+    if denied:
+        return denied
+
     try:
-        sync_subscriptions(user_id, subs)
+        body = await request.json()
+    except Exception:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+
+    user_id      = body.get("user_id")
+    upserts      = body.get("upserts", [])
+    deletes      = body.get("deletes", [])
+    base_version = body.get("base_version", _parse_if_match(request))
+
+    if (not isinstance(user_id, int) or not isinstance(upserts, list)
+            or not isinstance(deletes, list) or not all(isinstance(d, str) for d in deletes)
+            or (base_version is not None and not isinstance(base_version, int))):
+        return web.json_response(
+            {"error": "user_id (int), upserts (list), deletes (list of ids) and base_version (int) expected"},
+            status=422,
+        )
+
+    try:
+        # A queued full list is older than this delta; write it first.
+        await sync_buffer.flush(user_id)
+        result = await db.apply_subscription_delta(user_id, base_version, upserts, deletes)
+    except db.VersionConflict as e:
+        return web.json_response(
+            {"error": "Version conflict", "version": e.current_version},
+            status=409,
+            headers={"ETag": _etag(e.current_version)},
+        )
     except Exception as e:
-        logger.error(f"sync_subscriptions failed for user {user_id}: {e}")
+        logger.error(f"apply_subscription_delta failed for user {user_id}: {e}")
         return web.json_response({"error": "Internal server error"}, status=500)
 
-    logger.info(f"✅ Synced {len(subs)} subscriptions for user {user_id}")
-    return web.json_response({"ok": True, "synced": len(subs)})
+    if result["upserted"] or result["deleted"]:
+        manager_store.invalidate(user_id)
+        await reminder_scheduler.reschedule_user(user_id)
+
+    logger.info(
+        f"✅ Delta sync for user {user_id}: "
+        f"{result['upserted']} upserted, {result['deleted']} deleted, {len(result['rejected'])} rejected"
+    )
+    return web.json_response({"ok": True, **result}, headers={"ETag": _etag(result["version"])})
 
 
 async def start_api_server() -> web.AppRunner:
-    app = web.Application()
+    app = web.Application(middlewares=[_metrics_middleware])
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/admin/profile", handle_profile)
+    app.router.add_get("/api/subscriptions", handle_get_subscriptions)
     app.router.add_post("/api/sync", handle_sync)
+    app.router.add_post("/api/sync/delta", handle_sync_delta)
+    if WEBHOOK_URL:
+        app.router.add_post(WEBHOOK_PATH, webhook_ingress.handle)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", API_PORT)
@@ -244,85 +503,47 @@ async def start_api_server() -> web.AppRunner:
 
 
 # ── Reminder scheduler ────────────────────────────────────────────────────────
-REMINDER_TRANSLATIONS = {
-    "en": {
-        "title":    "⏰ Upcoming Renewal",
-        "body":     "Your <b>{name}</b> subscription renews in <b>{days} day{s}</b> ({date}) for <b>{amount} {currency}</b>.",
-        "trial":    "🆓 <b>{name}</b> free trial ends in <b>{days} day{s}</b> ({date}). It will charge <b>{amount} {currency}</b>.",
-        "today":    "Your <b>{name}</b> subscription renews <b>today</b> for <b>{amount} {currency}</b>.",
-        "trial_today": "🆓 <b>{name}</b> free trial ends <b>today</b>. Charge: <b>{amount} {currency}</b>.",
-    },
-    "ru": {
-        "title":    "⏰ Предстоящее списание",
-        "body":     "Подписка <b>{name}</b> продлится через <b>{days} дн.</b> ({date}) на сумму <b>{amount} {currency}</b>.",
-        "trial":    "🆓 Пробный период <b>{name}</b> заканчивается через <b>{days} дн.</b> ({date}). С вас спишут <b>{amount} {currency}</b>.",
-        "today":    "Подписка <b>{name}</b> продлевается <b>сегодня</b> на сумму <b>{amount} {currency}</b>.",
-        "trial_today": "🆓 Пробный период <b>{name}</b> заканчивается <b>сегодня</b>. Спишется <b>{amount} {currency}</b>.",
-    },
-    "uz": {
-        "title":    "⏰ Yaqinlashayotgan to'lov",
-        "body":     "<b>{name}</b> obunangiz <b>{days} kun</b> ichida ({date}) <b>{amount} {currency}</b> miqdorida yangilanadi.",
-        "trial":    "🆓 <b>{name}</b> sinov muddati <b>{days} kun</b> ichida ({date}) tugaydi. <b>{amount} {currency}</b> hisobdan chiqariladi.",
-        "today":    "<b>{name}</b> obunangiz <b>bugun</b> <b>{amount} {currency}</b> miqdorida yangilanadi.",
-        "trial_today": "🆓 <b>{name}</b> sinov muddati <b>bugun</b> tugaydi. <b>{amount} {currency}</b> hisobdan chiqariladi.",
-    },
-}
-
-
-def _format_reminder(sub: dict, lang: str) -> str:
-    msgs  = REMINDER_TRANSLATIONS.get(lang, REMINDER_TRANSLATIONS["en"])
-    today = date.today()
-    due   = date.fromisoformat(sub["next_billing_date"])
-    days  = (due - today).days
-    is_trial = bool(sub.get("is_free_trial"))
-
-    fmt_date   = due.strftime("%-d %b")     # e.g. "4 Mar"
-    fmt_amount = f"{sub['amount']:.2f}".rstrip("0").rstrip(".")
-    currency   = sub["currency"]
-    name       = sub["name"]
-    s          = "" if days == 1 else "s"   # pluralise for English
-
-    if days == 0:
-        template = msgs["trial_today"] if is_trial else msgs["today"]
-        body = template.format(name=name, amount=fmt_amount, currency=currency)
-    else:
-        template = msgs["trial"] if is_trial else msgs["body"]
-        body = template.format(name=name, days=days, s=s, date=fmt_date,
-                               amount=fmt_amount, currency=currency)
-
-    return f"{msgs['title']}\n\n{body}"
-
-
-async def run_reminder_scheduler() -> None:
-    """Check daily and send reminder messages for upcoming subscriptions."""
-    while True:
-        try:
-            due_subs = get_due_subscriptions(within_days=7)
-            seen: set[str] = set()   # avoid double-notifying same sub on same day
-            for sub in due_subs:
-                key = f"{sub['user_id']}:{sub['id']}"
-                if key in seen:
-                    continue
-                seen.add(key)
-                days_left = (date.fromisoformat(sub["next_billing_date"]) - date.today()).days
-                if days_left > sub.get("reminder_days", 3):
-                    continue   # not within the user's chosen reminder window
-                lang = sub.get("language") or "en"
-                text = _format_reminder(sub, lang)
-                try:
-                    await bot.send_message(
-                        chat_id=sub["user_id"],
-                        text=text,
-                        parse_mode="HTML",
-                    )
-                    logger.info(f"📨 Reminder sent → user {sub['user_id']} for '{sub['name']}'")
-                except Exception as send_err:
-                    logger.warning(f"Could not send reminder to {sub['user_id']}: {send_err}")
-        except Exception as e:
-            logger.error(f"Reminder scheduler error: {e}")
+async def send_reminder(sub: db.DueSubscription, offset: int, today: int) -> None:
+    """Send one reminder message; ``offset`` is the number of days before billing.
 
-        # Sleep until next check (every 12 hours)
-        await asyncio.sleep(12 * 3600)
+    Errors propagate so the dispatcher can retry or dead-letter the reminder.
+    """
+    text = render_reminder(sub, today)
+    await bot.send_message(
+        chat_id=sub.user_id,
+        text=text,
+        parse_mode="HTML",
+    )
+    logger.info(f"📨 Reminder sent → user {sub.user_id} for '{sub.name}'")
+
+
+reminder_dispatcher = ReminderDispatcher(
+    send_reminder,
+    permanent_errors=(TelegramForbiddenError, TelegramBadRequest),
+)
+reminder_scheduler = ReminderScheduler(reminder_dispatcher.submit, on_advanced=manager_store.invalidate_many)
+
+registry.collect(
+    "yodda_reminders_total",
+    "Reminder deliveries by outcome (failed ones were dead-lettered)",
+    lambda: {
+        ("sent",): reminder_dispatcher.sent,
+        ("failed",): reminder_dispatcher.failed,
+        ("retried",): reminder_dispatcher.retried,
+    },
+    type="counter",
+    labelnames=("outcome",),
+)
+registry.collect(
+    "yodda_reminders_scheduled",
+    "Reminders waiting in the scheduler heap",
+    lambda: {(): len(reminder_scheduler)},
+)
+registry.collect(
+    "yodda_sync_pending_users",
+    "Users with a full sync waiting to be written",
+    lambda: {(): len(sync_buffer)},
+)
 # ─────────────────────────────────────────────────────────────────────────────
 
 
@@ -384,7 +605,7 @@ async def send_user_info_to_group(user_id: int, user) -> None:
         )
         
         # Check if we already sent a message for this user
-        existing_msg_id = _get_field(user_id, "group_msg_id")
+        existing_msg_id = await _get_field(user_id, "group_msg_id")
         if existing_msg_id:
             # Update existing message
             try:
@@ -404,7 +625,7 @@ async def send_user_info_to_group(user_id: int, user) -> None:
                         text=message_text,
                         parse_mode='HTML'
                     )
-                    _set_field(user_id, group_msg_id=msg.message_id)
+                    await _set_field(user_id, group_msg_id=msg.message_id)
                     logger.info(f"Sent new group message for user {user_id}")
                 except Exception as e2:
                     logger.error(f"Failed to send new group message: {e2}")
@@ -415,7 +636,7 @@ async def send_user_info_to_group(user_id: int, user) -> None:
                 text=message_text,
                 parse_mode='HTML'
             )
-            _set_field(user_id, group_msg_id=msg.message_id)
+            await _set_field(user_id, group_msg_id=msg.message_id)
             logger.info(f"✅ Sent group message for user {user_id} to group {GROUP_ID}")
     except Exception as e:
         error_msg = str(e)
@@ -434,10 +655,10 @@ async def send_user_info_to_group(user_id: int, user) -> None:
             logger.error("   Make bot an admin or give 'Send Messages' permission")
 
 
-def build_web_app_url(user_id: int, user_lang: str) -> str:
+async def build_web_app_url(user_id: int, user_lang: str) -> str:
     """Build web app URL with user profile data."""
     web_app_url = os.getenv('WEB_APP_URL', 'https://your-web-app-url.com')
-    row = get_user(user_id) or {}
+    row = await db.get_user(user_id) or {}
 
     first_name = row.get("first_name") or ""
     last_name  = row.get("last_name") or ""
@@ -462,16 +683,16 @@ async def cmd_start(message: Message):
     user = message.from_user
 
     # Upsert user profile (always keep name/username fresh)
-    upsert_user(user_id,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                username=user.username)
+    await db.upsert_user(user_id,
+                         first_name=user.first_name,
+                         last_name=user.last_name,
+                         username=user.username)
 
     # Cache profile photo once
-    if not _get_field(user_id, "photo_url"):
+    if not await _get_field(user_id, "photo_url"):
         photo_path = await get_user_photo_url(user_id)
         if photo_path:
-            _set_field(user_id, photo_url=f"https://api.telegram.org/file/bot{BOT_TOKEN}/{photo_path}")
+            await _set_field(user_id, photo_url=f"https://api.telegram.org/file/bot{BOT_TOKEN}/{photo_path}")
 
     # Notify group
     try:
@@ -479,13 +700,13 @@ async def cmd_start(message: Message):
     except Exception as e:
         logger.error(f"Error sending user info to group: {e}")
 
-    user_lang = _get_field(user_id, "language")
+    user_lang = await _get_field(user_id, "language")
 
     if user_lang:
         # Already chose a language — go straight to the app
         msgs = TRANSLATIONS[user_lang]
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=msgs["button"], web_app={"url": build_web_app_url(user_id, user_lang)})]
+            [InlineKeyboardButton(text=msgs["button"], web_app={"url": await build_web_app_url(user_id, user_lang)})]
         ])
         await message.answer(msgs["start"], reply_markup=keyboard)
     else:
@@ -511,15 +732,15 @@ async def handle_language_callback(callback: CallbackQuery):
         await callback.answer()
         return
 
-    _set_field(user_id, language=selected_lang,
+    await _set_field(user_id, language=selected_lang,
                first_name=user.first_name,
                last_name=user.last_name,
                username=user.username)
 
-    if not _get_field(user_id, "photo_url"):
+    if not await _get_field(user_id, "photo_url"):
         photo_path = await get_user_photo_url(user_id)
         if photo_path:
-            _set_field(user_id, photo_url=f"https://api.telegram.org/file/bot{BOT_TOKEN}/{photo_path}")
+            await _set_field(user_id, photo_url=f"https://api.telegram.org/file/bot{BOT_TOKEN}/{photo_path}")
 
     try:
         await send_user_info_to_group(user_id, user)
@@ -528,7 +749,7 @@ async def handle_language_callback(callback: CallbackQuery):
 
     msgs = TRANSLATIONS[selected_lang]
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=msgs["button"], web_app={"url": build_web_app_url(user_id, selected_lang)})]
+        [InlineKeyboardButton(text=msgs["button"], web_app={"url": await build_web_app_url(user_id, selected_lang)})]
     ])
     await callback.answer()
     await callback.message.edit_text(msgs["language_selected"], reply_markup=keyboard)
@@ -539,7 +760,7 @@ async def handle_message(message: Message):
     """Handle regular text messages — just reply with the fallback hint."""
     user_id = message.from_user.id
     user = message.from_user
-    user_lang = _get_field(user_id, "language") or detect_language(user)
+    user_lang = await _get_field(user_id, "language") or detect_language(user)
     msgs = TRANSLATIONS[user_lang]
     logger.info("Received message from %s: %s", user_id, message.text)
     await message.answer(msgs["fallback"])
@@ -610,9 +831,31 @@ async def error_handler(update, exception):
     return True
 
 
+async def run_webhook() -> None:
+    """Receive updates through the API server's webhook route until cancelled.
+
+    The webhook is left registered on shutdown so other instances behind the
+    same URL keep receiving updates.
+    """
+    if not WEBHOOK_SECRET:
+        logger.warning("⚠️  WEBHOOK_SECRET not set — webhook requests are not authenticated")
+    webhook_ingress.start()
+    await dp.emit_startup(bot=bot)
+    try:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+        logger.info(f"🪝 Receiving updates via webhook at {WEBHOOK_URL}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await dp.emit_shutdown(bot=bot)
+
+
 async def main():
     """Start the bot, HTTP sync API, and reminder scheduler."""
-    init_db()
+    await db.init_db()
     logger.info("Starting Yodda bot…")
     logger.info(f"Bot token: {BOT_TOKEN[:10]}…")
 
@@ -626,18 +869,45 @@ async def main():
     else:
         logger.warning("⚠️  GROUP_ID not set — group messaging disabled")
 
-    # Start the HTTP sync API
+    # Queue anything left in the sync journal, then start the HTTP sync API
+    await sync_buffer.start()
     api_runner = await start_api_server()
 
-    # Start the reminder scheduler as a background task
-    scheduler_task = asyncio.create_task(run_reminder_scheduler())
+    # Start the reminder dispatcher and scheduler as background tasks
+    reminder_dispatcher.start()
+    scheduler_task = asyncio.create_task(reminder_scheduler.run())
+    watchdog_task = asyncio.create_task(loop_watchdog.run())
     logger.info("⏰ Reminder scheduler started")
 
     try:
-        await dp.start_polling(bot, allowed_updates=["message", "callback_query"])
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            # A webhook left registered by an earlier webhook-mode run makes
+            # getUpdates fail with a conflict, and start_polling does not
+            # remove it.
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
     finally:
         scheduler_task.cancel()
+        watchdog_task.cancel()
+        # Let the scheduler release claims it has not handed over yet, then
+        # release whatever the dispatcher still holds.
+        await asyncio.gather(scheduler_task, return_exceptions=True)
+        await reminder_dispatcher.stop()
         await api_runner.cleanup()
+        await sync_buffer.stop()
+        logger.info(f"Sync buffer stats: {sync_buffer.stats()}")
+        if WEBHOOK_URL:
+            await webhook_ingress.stop()
+            logger.info(f"Webhook stats: {webhook_ingress.stats()}")
+            # start_polling closes the session itself; in webhook mode it is
+            # closed once the queued updates have been handled.
+            await bot.session.close()
+        logger.info(f"User cache stats: {db.user_cache.stats()}")
+        logger.info(f"Manager store stats: {manager_store.stats()}")
+        logger.info(f"Event loop stalls: {loop_watchdog.stalls} (longest {loop_watchdog.longest:.2f}s)")
+        db.pool.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,922 @@
+"""SQLite persistence for the Yodda bot.
+
+Every query runs on a small pool of long-lived connections owned by a
+dedicated thread pool, so aiogram handlers and the aiohttp sync API ``await``
+database work instead of blocking the event loop with disk I/O.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, NamedTuple, TypeVar
+
+from metrics import registry
+from recurrence import advance_many
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", "yodda_users.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "600"))
+
+T = TypeVar("T")
+
+# Applied to every pooled connection once, right after it is opened.
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers never block the writer
+    "PRAGMA synchronous = NORMAL",      # safe with WAL, far fewer fsyncs
+    "PRAGMA busy_timeout = 5000",       # wait for the write lock instead of failing
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",        # ~8 MB page cache per connection
+    "PRAGMA mmap_size = 134217728",     # 128 MB
+)
+
+# Size of sqlite3's per-connection prepared statement cache.  All hot queries
+# below use constant SQL text so they are compiled once per connection.
+_STATEMENT_CACHE = 256
+
+
+QUERY_SECONDS = registry.histogram(
+    "yodda_db_query_seconds",
+    "Time spent running a database call on a pooled connection",
+    ("query",),
+)
+
+
+class ConnectionPool:
+    """Runs blocking SQLite calls on worker threads that each own one connection.
+
+    Connections are opened lazily the first time a worker thread is used and
+    stay open for the life of the process.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="yodda-db")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _call(self, fn: Callable[..., T], args: tuple) -> T:
+        conn = self._connection()
+        started = time.perf_counter()
+        try:
+            return fn(conn, *args)
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, fn.__name__.lstrip("_"))
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn(conn, *args)`` on a pooled connection and await the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+# ── Schema ────────────────────────────────────────────────────────────────────
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_day(d: date) -> int:
+    """Days since 1970-01-01; the sortable integer form of a billing date."""
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+def from_epoch_day(day: int) -> date:
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+def _migration_1_baseline(conn: sqlite3.Connection) -> None:
+    # IF NOT EXISTS so databases created before migrations were tracked
+    # are adopted as-is.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id     INTEGER PRIMARY KEY,
+            language    TEXT,
+            phone       TEXT,
+            first_name  TEXT,
+            last_name   TEXT,
+            username    TEXT,
+            photo_url   TEXT,
+            group_msg_id INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id                  TEXT    NOT NULL,
+            user_id             INTEGER NOT NULL,
+            name                TEXT    NOT NULL,
+            category            TEXT    NOT NULL,
+            amount              REAL    NOT NULL,
+            currency            TEXT    NOT NULL,
+            billing_cycle_type  TEXT    NOT NULL,
+            billing_cycle_value INTEGER NOT NULL DEFAULT 1,
+            next_billing_date   TEXT    NOT NULL,
+            reminder_days       INTEGER NOT NULL DEFAULT 3,
+            notes               TEXT,
+            is_free_trial       INTEGER NOT NULL DEFAULT 0,
+            created_at          TEXT    NOT NULL,
+            PRIMARY KEY (id, user_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_dead_letters (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id       INTEGER NOT NULL,
+            sub_id        TEXT    NOT NULL,
+            billing_date  TEXT    NOT NULL,
+            offset_days   INTEGER NOT NULL,
+            attempts      INTEGER NOT NULL,
+            error         TEXT,
+            failed_at     TEXT    NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_deliveries (
+            user_id       INTEGER NOT NULL,
+            sub_id        TEXT    NOT NULL,
+            billing_date  TEXT    NOT NULL,
+            offset_days   INTEGER NOT NULL,
+            delivered_at  TEXT    NOT NULL,
+            PRIMARY KEY (user_id, sub_id, billing_date, offset_days)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminder_deliveries_date ON reminder_deliveries (billing_date)"
+    )
+
+
+def _migration_2_billing_day(conn: sqlite3.Connection) -> None:
+    # Billing dates are also stored as epoch days so the due-window queries
+    # compare integers through an index instead of scanning ISO strings.
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN billing_day INTEGER")
+    conn.execute(
+        "UPDATE subscriptions SET billing_day = "
+        "CAST(julianday(substr(next_billing_date, 1, 10)) - 2440587.5 AS INTEGER)"
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_subscriptions_user")
+    conn.execute("CREATE INDEX idx_subscriptions_due ON subscriptions (billing_day, user_id, id)")
+    conn.execute("CREATE INDEX idx_subscriptions_user_due ON subscriptions (user_id, billing_day)")
+
+
+def _migration_3_billing_anchor(conn: sqlite3.Connection) -> None:
+    # The day of month a month-based cycle bills on.  next_billing_date is
+    # clamped in short months (31 Jan -> 28 Feb), so rolling it forward again
+    # needs the original day.  Existing rows start from their current date.
+    conn.execute("ALTER TABLE subscriptions ADD COLUMN billing_anchor_day INTEGER")
+    conn.execute(
+        "UPDATE subscriptions SET billing_anchor_day = CAST(substr(next_billing_date, 9, 2) AS INTEGER)"
+    )
+
+
+# Append-only: never edit or reorder a migration once it has shipped.
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline", _migration_1_baseline),
+    (2, "billing_day", _migration_2_billing_day),
+    (3, "billing_anchor", _migration_3_billing_anchor),
+]
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version     INTEGER PRIMARY KEY,
+                name        TEXT    NOT NULL,
+                applied_at  TEXT    NOT NULL
+            )
+        """)
+    for version, name, migrate in MIGRATIONS:
+        with conn:
+            # BEGIN IMMEDIATE so two processes starting together cannot both
+            # apply the same migration.
+            conn.execute("BEGIN IMMEDIATE")
+            applied = conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = ?", (version,)
+            ).fetchone()
+            if applied:
+                continue
+            migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?,?,?)",
+                (version, name, datetime.utcnow().isoformat()),
+            )
+        logger.info(f"Applied schema migration {version} ({name})")
+
+
+async def init_db() -> None:
+    await pool.run(_init_db)
+
+
+# ── Users ─────────────────────────────────────────────────────────────────────
+USER_COLUMNS = frozenset({
+    "language", "phone", "first_name", "last_name", "username", "photo_url", "group_msg_id",
+})
+
+_SELECT_USER = "SELECT * FROM users WHERE user_id = ?"
+
+
+class UserCache:
+    """Bounded LRU of user rows with a per-entry TTL.
+
+    Only touched from the event loop, so it needs no locking.  Writes go
+    through ``upsert_user`` which patches the cached row after the database
+    commit, keeping the cache consistent with what was just written.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        # Bumped on every write; a read that raced with a write is not cached.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, user_id: int) -> dict | None:
+        entry = self._rows.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, row = entry
+        if expires < time.monotonic():
+            del self._rows[user_id]
+            self.misses += 1
+            return None
+        self._rows.move_to_end(user_id)
+        self.hits += 1
+        return dict(row)
+
+    def put(self, user_id: int, row: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        self._rows[user_id] = (time.monotonic() + self.ttl, dict(row))
+        self._rows.move_to_end(user_id)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, user_id: int, fields: dict) -> None:
+        self.generation += 1
+        entry = self._rows.get(user_id)
+        if entry is not None:
+            entry[1].update(fields)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        self.generation += 1
+        if user_id is None:
+            self._rows.clear()
+        else:
+            self._rows.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._rows),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+registry.collect(
+    "yodda_user_cache_lookups_total",
+    "User profile cache lookups by result",
+    lambda: {("hit",): user_cache.hits, ("miss",): user_cache.misses},
+    type="counter",
+    labelnames=("result",),
+)
+registry.collect(
+    "yodda_user_cache_evictions_total",
+    "User profile rows evicted to stay within USER_CACHE_SIZE",
+    lambda: {(): user_cache.evictions},
+    type="counter",
+)
+registry.collect(
+    "yodda_user_cache_size",
+    "User profile rows currently cached",
+    lambda: {(): len(user_cache)},
+)
+
+
+def _get_user(conn: sqlite3.Connection, user_id: int) -> dict | None:
+    row = conn.execute(_SELECT_USER, (user_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def _upsert_user(conn: sqlite3.Connection, user_id: int, fields: dict) -> dict:
+    cols = ", ".join(fields)
+    placeholders = ", ".join("?" * (len(fields) + 1))
+    updates = ", ".join(f"{k} = excluded.{k}" for k in fields)
+    # The SQL text only depends on which columns are set, so each shape is
+    # prepared once and then served from the statement cache.  RETURNING
+    # hands back the whole row so the cache is filled without a second read.
+    with conn:
+        row = conn.execute(
+            f"INSERT INTO users (user_id, {cols}) VALUES ({placeholders}) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {updates} RETURNING *",
+            (user_id, *fields.values()),
+        ).fetchone()
+    return dict(row)
+
+
+async def get_user(user_id: int) -> dict | None:
+    row = user_cache.get(user_id)
+    if row is not None:
+        return row
+    generation = user_cache.generation
+    row = await pool.run(_get_user, user_id)
+    if row is not None and user_cache.generation == generation:
+        user_cache.put(user_id, row)
+    return row
+
+
+async def upsert_user(user_id: int, **fields) -> None:
+    unknown = fields.keys() - USER_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+    if not fields:
+        return
+    generation = user_cache.generation
+    try:
+        row = await pool.run(_upsert_user, user_id, fields)
+    except BaseException:
+        user_cache.invalidate(user_id)
+        raise
+    raced = user_cache.generation != generation
+    user_cache.update(user_id, fields)
+    if not raced:
+        # Nothing else touched the cache meanwhile, so the returned row is
+        # the latest; a cold /start then needs no read at all.
+        user_cache.put(user_id, row)
+
+
+# ── Subscriptions ─────────────────────────────────────────────────────────────
+class VersionConflict(Exception):
+    """Raised when a client writes against a stale per-user sync version."""
+
+    def __init__(self, current_version: int) -> None:
+        super().__init__(f"stale sync version, current is {current_version}")
+        self.current_version = current_version
+
+
+_UPSERT_SUBSCRIPTION = """INSERT INTO subscriptions
+   (id, user_id, name, category, amount, currency,
+    billing_cycle_type, billing_cycle_value,
+    next_billing_date, reminder_days, notes,
+    is_free_trial, created_at, billing_day, billing_anchor_day)
+   VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+   ON CONFLICT (id, user_id) DO UPDATE SET
+    name = excluded.name, category = excluded.category,
+    amount = excluded.amount, currency = excluded.currency,
+    billing_cycle_type = excluded.billing_cycle_type,
+    billing_cycle_value = excluded.billing_cycle_value,
+    next_billing_date = excluded.next_billing_date,
+    reminder_days = excluded.reminder_days, notes = excluded.notes,
+    is_free_trial = excluded.is_free_trial, billing_day = excluded.billing_day,
+    billing_anchor_day = CASE WHEN excluded.next_billing_date = subscriptions.next_billing_date
+                              THEN subscriptions.billing_anchor_day
+                              ELSE excluded.billing_anchor_day END"""
+
+_DELETE_SUBSCRIPTION = "DELETE FROM subscriptions WHERE id = ? AND user_id = ?"
+
+# Everything except created_at, which is set once on insert, and billing_day,
+# which is derived from next_billing_date.  Upsert rows are compared on their
+# first _DIFF_WIDTH columns.
+_DIFF_WIDTH = 12
+_SELECT_USER_SUBSCRIPTIONS = """SELECT id, user_id, name, category, amount, currency,
+          billing_cycle_type, billing_cycle_value,
+          next_billing_date, reminder_days, notes, is_free_trial
+   FROM subscriptions WHERE user_id = ?"""
+
+_SELECT_USER_ROWS = """SELECT id, name, category, amount, currency,
+          billing_cycle_type, billing_cycle_value, next_billing_date,
+          reminder_days, notes, is_free_trial, created_at
+   FROM subscriptions WHERE user_id = ? ORDER BY created_at, id"""
+
+_SELECT_VERSION = "SELECT version FROM sync_versions WHERE user_id = ?"
+
+_BUMP_VERSION = """INSERT INTO sync_versions (user_id, version) VALUES (?, 1)
+   ON CONFLICT (user_id) DO UPDATE SET version = version + 1"""
+
+# delivered_offsets lists (comma separated) the reminder offsets already sent
+# for the row's current billing date, resolved through the deliveries primary
+# key so the scheduler never has to load the delivery log itself.
+_DELIVERED_OFFSETS = """(SELECT group_concat(d.offset_days)
+       FROM reminder_deliveries d
+       WHERE d.user_id = s.user_id AND d.sub_id = s.id
+         AND d.billing_date = s.next_billing_date) AS delivered_offsets"""
+
+_DUE_COLUMNS = f"""s.user_id, s.id, s.name, s.amount, s.currency,
+          s.next_billing_date, s.billing_day, s.reminder_days, s.is_free_trial,
+          u.language, {_DELIVERED_OFFSETS}"""
+
+# Keyset-paginated over idx_subscriptions_due so each chunk is an index range
+# scan that resumes after the last (billing_day, user_id, id) seen.
+_SELECT_DUE_CHUNK = f"""SELECT {_DUE_COLUMNS}
+   FROM subscriptions s
+   JOIN users u ON s.user_id = u.user_id
+   WHERE (s.billing_day, s.user_id, s.id) > (?, ?, ?) AND s.billing_day <= ?
+   ORDER BY s.billing_day, s.user_id, s.id
+   LIMIT ?"""
+
+# Rows whose billing date has passed, found through idx_subscriptions_due.
+_SELECT_STALE = """SELECT user_id, id, billing_day, billing_cycle_type, billing_cycle_value,
+          billing_anchor_day
+   FROM subscriptions WHERE billing_day < ?"""
+
+_ADVANCE_BILLING = """UPDATE subscriptions SET next_billing_date = ?, billing_day = ?
+   WHERE id = ? AND user_id = ?"""
+
+_SELECT_USER_DUE = f"""SELECT {_DUE_COLUMNS}
+   FROM subscriptions s
+   JOIN users u ON s.user_id = u.user_id
+   WHERE s.user_id = ? AND s.billing_day BETWEEN ? AND ?"""
+
+# One subscription by primary key, still on the given billing date.
+_SELECT_REMINDER_ROW = f"""SELECT {_DUE_COLUMNS}
+   FROM subscriptions s
+   JOIN users u ON s.user_id = u.user_id
+   WHERE s.id = ? AND s.user_id = ? AND s.next_billing_date = ?"""
+
+
+class DueSubscription(NamedTuple):
+    """The fields of a due subscription that reminders need, as a plain tuple."""
+
+    user_id: int
+    id: str
+    name: str
+    amount: float
+    currency: str
+    next_billing_date: str
+    billing_day: int
+    reminder_days: int
+    is_free_trial: int
+    language: str | None
+    delivered_offsets: str | None
+
+
+class SubscriptionBatch:
+    """Column-oriented, validated subscription payload for one user.
+
+    Each attribute is a list holding one column; ``rows()`` zips them back into
+    parameter tuples in ``_UPSERT_SUBSCRIPTION`` order for ``executemany``.
+    """
+
+    __slots__ = (
+        "user_id", "ids", "names", "categories", "amounts", "currencies",
+        "cycle_types", "cycle_values", "billing_dates", "reminder_days",
+        "notes", "free_trials", "created_at", "billing_days",
+    )
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        for name in self.__slots__[1:]:
+            setattr(self, name, [])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self) -> list[tuple]:
+        n = len(self.ids)
+        return list(zip(
+            self.ids, [self.user_id] * n, self.names, self.categories,
+            self.amounts, self.currencies, self.cycle_types, self.cycle_values,
+            self.billing_dates, self.reminder_days, self.notes, self.free_trials,
+            self.created_at, self.billing_days,
+            # The billing date's own day becomes the anchor; an upsert keeps
+            # the stored anchor while the date is unchanged.
+            [int(billing_date[8:10]) for billing_date in self.billing_dates],
+        ))
+
+
+def _require_str(s: dict, key: str) -> str:
+    value = s.get(key)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{key} must be a non-empty string")
+    return value
+
+
+def _require_int(s: dict, key: str, default: int, minimum: int) -> int:
+    value = s.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+        raise ValueError(f"{key} must be an integer")
+    if value < minimum:
+        raise ValueError(f"{key} must be >= {minimum}")
+    return int(value)
+
+
+def validate_subscriptions(user_id: int, subs: list) -> tuple[SubscriptionBatch, list[dict]]:
+    """Validate and normalise a whole payload in one pass.
+
+    Returns the batch of valid rows and a list of per-row errors
+    (``{"index", "id", "error"}``) for the ones that were rejected.
+    """
+    batch = SubscriptionBatch(user_id)
+    errors: list[dict] = []
+    seen: set[str] = set()
+    parsed_dates: dict[str, tuple[str, int]] = {}
+    now = datetime.utcnow().isoformat()
+
+    for index, s in enumerate(subs):
+        sub_id = s.get("id") if isinstance(s, dict) else None
+        try:
+            if not isinstance(s, dict):
+                raise ValueError("subscription must be an object")
+            sub_id = _require_str(s, "id")
+            if sub_id in seen:
+                raise ValueError("duplicate id in payload")
+            name     = _require_str(s, "name")
+            category = _require_str(s, "category")
+            currency = _require_str(s, "currency")
+            cycle    = _require_str(s, "billing_cycle_type")
+
+            amount = s.get("amount")
+            if isinstance(amount, str):
+                amount = float(amount)
+            if isinstance(amount, bool) or not isinstance(amount, (int, float)) \
+                    or not math.isfinite(amount) or amount < 0:
+                raise ValueError("amount must be a non-negative number")
+
+            cycle_value = _require_int(s, "billing_cycle_value", 1, 1)
+            reminder    = _require_int(s, "reminder_days", 3, 0)
+
+            raw_date = s.get("next_billing_date")
+            parsed = parsed_dates.get(raw_date) if isinstance(raw_date, str) else None
+            if parsed is None:
+                if not isinstance(raw_date, str):
+                    raise ValueError("next_billing_date must be an ISO date string")
+                due = date.fromisoformat(raw_date[:10])
+                parsed = parsed_dates[raw_date] = (due.isoformat(), to_epoch_day(due))
+            billing_date, billing_day = parsed
+
+            notes = s.get("notes")
+            if notes is not None and not isinstance(notes, str):
+                raise ValueError("notes must be a string")
+            created_at = s.get("created_at") or now
+            if not isinstance(created_at, str):
+                raise ValueError("created_at must be a string")
+        except (ValueError, TypeError, OverflowError) as e:
+            errors.append({"index": index, "id": sub_id if isinstance(sub_id, str) else None, "error": str(e)})
+            continue
+
+        seen.add(sub_id)
+        batch.ids.append(sub_id)
+        batch.names.append(name)
+        batch.categories.append(category)
+        batch.amounts.append(float(amount))
+        batch.currencies.append(currency)
+        batch.cycle_types.append(cycle)
+        batch.cycle_values.append(cycle_value)
+        batch.billing_dates.append(billing_date)
+        batch.billing_days.append(billing_day)
+        batch.reminder_days.append(reminder)
+        batch.notes.append(notes)
+        batch.free_trials.append(int(bool(s.get("is_free_trial", False))))
+        batch.created_at.append(created_at)
+
+    return batch, errors
+
+
+def _version(conn: sqlite3.Connection, user_id: int) -> int:
+    row = conn.execute(_SELECT_VERSION, (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def _write_changes(conn: sqlite3.Connection, user_id: int,
+                   upserts: list[tuple], deletes: list[str]) -> int:
+    """Apply row changes and bump the user's version if anything was written."""
+    if upserts:
+        conn.executemany(_UPSERT_SUBSCRIPTION, upserts)
+    if deletes:
+        conn.executemany(_DELETE_SUBSCRIPTION, [(sub_id, user_id) for sub_id in deletes])
+    if upserts or deletes:
+        conn.execute(_BUMP_VERSION, (user_id,))
+    return _version(conn, user_id)
+
+
+def _sync_batch(conn: sqlite3.Connection, batch: SubscriptionBatch, rejected: list[dict]) -> dict:
+    """Diff and write one user's validated full list; runs inside the caller's transaction."""
+    user_id = batch.user_id
+    rows = batch.rows()
+    # A rejected row keeps whatever is stored for its id rather than being
+    # treated as removed from the list.
+    keep = set(batch.ids).union(e["id"] for e in rejected if e["id"])
+    existing = {
+        r["id"]: tuple(r)
+        for r in conn.execute(_SELECT_USER_SUBSCRIPTIONS, (user_id,))
+    }
+    changed = [row for row in rows if existing.get(row[0]) != row[:_DIFF_WIDTH]]
+    removed = [sub_id for sub_id in existing if sub_id not in keep]
+    version = _write_changes(conn, user_id, changed, removed)
+    return {"version": version, "upserted": len(changed), "deleted": len(removed), "rejected": rejected}
+
+
+def _sync_subscriptions(conn: sqlite3.Connection, user_id: int, subs: list) -> dict:
+    batch, rejected = validate_subscriptions(user_id, subs)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return _sync_batch(conn, batch, rejected)
+
+
+def _sync_many(conn: sqlite3.Connection,
+               batches: list[tuple[SubscriptionBatch, list[dict]]]) -> list[dict]:
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return [_sync_batch(conn, batch, rejected) for batch, rejected in batches]
+
+
+def _apply_delta(conn: sqlite3.Connection, user_id: int, base_version: int | None,
+                 upserts: list, deletes: list[str]) -> dict:
+    batch, rejected = validate_subscriptions(user_id, upserts)
+    rows = batch.rows()
+    with conn:
+        # Take the write lock before reading the version so the check and the
+        # write are atomic across pooled connections.
+        conn.execute("BEGIN IMMEDIATE")
+        current = _version(conn, user_id)
+        if base_version is not None and base_version != current:
+            raise VersionConflict(current)
+        version = _write_changes(conn, user_id, rows, deletes)
+    return {"version": version, "upserted": len(rows), "deleted": len(deletes), "rejected": rejected}
+
+
+def _load_user_subscriptions(conn: sqlite3.Connection, user_id: int) -> tuple[int, list[tuple]]:
+    with conn:
+        # One read transaction so the rows and the version match.
+        conn.execute("BEGIN")
+        version = _version(conn, user_id)
+        cur = conn.execute(_SELECT_USER_ROWS, (user_id,))
+        cur.row_factory = None
+        return version, cur.fetchall()
+
+
+def _save_user_subscriptions(conn: sqlite3.Connection, user_id: int, base_version: int,
+                             upserts: list[tuple], deletes: list[str]) -> int:
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        current = _version(conn, user_id)
+        if base_version != current:
+            raise VersionConflict(current)
+        return _write_changes(conn, user_id, upserts, deletes)
+
+
+def _advance_billing_dates(conn: sqlite3.Connection, today: int) -> set[int]:
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.execute(_SELECT_STALE, (today,))
+        cur.row_factory = None
+        rows = cur.fetchall()
+        if not rows:
+            return set()
+        user_ids, sub_ids, days, cycle_types, cycle_values, anchor_days = zip(*rows)
+        advanced = advance_many(days, cycle_types, cycle_values, today, anchor_days)
+        conn.executemany(_ADVANCE_BILLING, [
+            (from_epoch_day(day).isoformat(), day, sub_id, user_id)
+            for day, sub_id, user_id in zip(advanced, sub_ids, user_ids)
+        ])
+        changed = set(user_ids)
+        conn.executemany(_BUMP_VERSION, [(user_id,) for user_id in changed])
+    return changed
+
+
+def _get_due_chunk(conn: sqlite3.Connection, after: tuple, end: int, limit: int) -> list[DueSubscription]:
+    cur = conn.execute(_SELECT_DUE_CHUNK, (*after, end, limit))
+    cur.row_factory = None
+    return list(map(DueSubscription._make, cur))
+
+
+def _get_user_due_subscriptions(conn: sqlite3.Connection, user_id: int,
+                                start: int, end: int) -> list[DueSubscription]:
+    cur = conn.execute(_SELECT_USER_DUE, (user_id, start, end))
+    cur.row_factory = None
+    return list(map(DueSubscription._make, cur))
+
+
+async def sync_subscriptions(user_id: int, subs: list[dict]) -> dict:
+    """Make the user's stored subscriptions match ``subs`` (full-list sync).
+
+    The list is diffed against what is stored so only new, changed and removed
+    rows are written.  Malformed rows are skipped and reported under
+    ``rejected`` instead of failing the whole sync.  Returns the new sync
+    version and the write counts.
+    """
+    return await pool.run(_sync_subscriptions, user_id, subs)
+
+
+async def sync_many(batches: list[tuple[SubscriptionBatch, list[dict]]]) -> list[dict]:
+    """Full-list syncs for several users in one transaction.
+
+    Takes ``validate_subscriptions`` results and returns one
+    ``sync_subscriptions``-style result per batch, in order.
+    """
+    return await pool.run(_sync_many, batches)
+
+
+async def apply_subscription_delta(user_id: int, base_version: int | None,
+                                   upserts: list[dict], deletes: list[str]) -> dict:
+    """Upsert and delete individual subscriptions keyed by ``(id, user_id)``.
+
+    Raises ``VersionConflict`` if ``base_version`` is given and no longer
+    matches the user's stored version.
+    """
+    return await pool.run(_apply_delta, user_id, base_version, upserts, deletes)
+
+
+async def load_user_subscriptions(user_id: int) -> tuple[int, list[tuple]]:
+    """A user's sync version and all their rows, in ``_SELECT_USER_ROWS`` column order."""
+    return await pool.run(_load_user_subscriptions, user_id)
+
+
+async def save_user_subscriptions(user_id: int, base_version: int,
+                                  upserts: list[tuple], deletes: list[str]) -> int:
+    """Write already-validated ``_UPSERT_SUBSCRIPTION`` rows and deletions in one transaction.
+
+    Raises ``VersionConflict`` unless the stored version is still ``base_version``.
+    """
+    return await pool.run(_save_user_subscriptions, user_id, base_version, upserts, deletes)
+
+
+async def get_sync_version(user_id: int) -> int:
+    return await pool.run(_version, user_id)
+
+
+async def advance_billing_dates() -> set[int]:
+    """Roll every past ``next_billing_date`` forward to its next renewal.
+
+    Runs as one transaction and bumps the sync version of each affected user;
+    returns their ids.
+    """
+    return await pool.run(_advance_billing_dates, to_epoch_day(date.today()))
+
+
+async def iter_due_subscriptions(within_days: int = 7,
+                                 chunk_size: int = 1000) -> AsyncIterator[DueSubscription]:
+    """Yield every subscription billing within the next N days, in billing order.
+
+    Rows are fetched ``chunk_size`` at a time, so memory stays flat however
+    many subscriptions are due.
+    """
+    today = to_epoch_day(date.today())
+    after: tuple = (today, -1 << 63, "")
+    while True:
+        chunk = await pool.run(_get_due_chunk, after, today + within_days, chunk_size)
+        for sub in chunk:
+            yield sub
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        after = (last.billing_day, last.user_id, last.id)
+
+
+async def get_user_due_subscriptions(user_id: int, within_days: int = 7) -> list[DueSubscription]:
+    """Subscriptions of one user billing within the next N days."""
+    today = to_epoch_day(date.today())
+    return await pool.run(_get_user_due_subscriptions, user_id, today, today + within_days)
+
+
+def _get_reminder_subscriptions(conn: sqlite3.Connection,
+                                keys: set[tuple]) -> dict[tuple, DueSubscription]:
+    rows = {}
+    for user_id, sub_id, billing_date in keys:
+        cur = conn.execute(_SELECT_REMINDER_ROW, (sub_id, user_id, billing_date))
+        cur.row_factory = None
+        row = cur.fetchone()
+        if row is not None:
+            rows[user_id, sub_id, billing_date] = DueSubscription._make(row)
+    return rows
+
+
+async def get_reminder_subscriptions(keys: list[tuple]) -> dict[tuple, DueSubscription]:
+    """Current rows for reminder keys, by ``(user_id, sub_id, billing_date)``.
+
+    Keys whose subscription is gone or now bills on another date are missing
+    from the result.
+    """
+    return await pool.run(_get_reminder_subscriptions, {key[:3] for key in keys})
+
+
+# ── Reminder delivery ─────────────────────────────────────────────────────────
+_INSERT_DEAD_LETTER = """INSERT INTO reminder_dead_letters
+   (user_id, sub_id, billing_date, offset_days, attempts, error, failed_at)
+   VALUES (?,?,?,?,?,?,?)"""
+
+
+def _add_dead_letter(conn: sqlite3.Connection, row: tuple) -> None:
+    with conn:
+        conn.execute(_INSERT_DEAD_LETTER, row)
+
+
+async def add_dead_letter(user_id: int, sub_id: str, billing_date: str,
+                          offset: int, attempts: int, error: str) -> None:
+    """Record a reminder that could not be delivered."""
+    row = (user_id, sub_id, billing_date, offset, attempts, error, datetime.utcnow().isoformat())
+    await pool.run(_add_dead_letter, row)
+
+
+_CLAIM_DELIVERY = """INSERT OR IGNORE INTO reminder_deliveries
+   (user_id, sub_id, billing_date, offset_days, delivered_at)
+   VALUES (?,?,?,?,?)"""
+
+_RELEASE_DELIVERY = """DELETE FROM reminder_deliveries
+   WHERE user_id = ? AND sub_id = ? AND billing_date = ? AND offset_days = ?"""
+
+
+def _claim_reminders(conn: sqlite3.Connection, keys: list[tuple]) -> list[tuple]:
+    now = datetime.utcnow().isoformat()
+    claimed = []
+    with conn:
+        for key in keys:
+            if conn.execute(_CLAIM_DELIVERY, (*key, now)).rowcount:
+                claimed.append(key)
+    return claimed
+
+
+def _release_reminders(conn: sqlite3.Connection, keys: list[tuple]) -> None:
+    with conn:
+        conn.executemany(_RELEASE_DELIVERY, keys)
+
+
+def _prune_deliveries(conn: sqlite3.Connection, before: str) -> int:
+    with conn:
+        return conn.execute("DELETE FROM reminder_deliveries WHERE billing_date < ?", (before,)).rowcount
+
+
+async def claim_reminders(keys: list[tuple]) -> set[tuple]:
+    """Record ``(user_id, sub_id, billing_date, offset)`` reminders as delivered.
+
+    Returns the keys that were not already in the log; only those should be
+    sent.  Claiming before sending makes delivery at-most-once across restarts;
+    claims that were never sent are given back with ``release_reminders`` on
+    shutdown.
+    """
+    if not keys:
+        return set()
+    return set(await pool.run(_claim_reminders, keys))
+
+
+async def release_reminders(keys: list[tuple]) -> None:
+    """Undo ``claim_reminders`` for reminders that were claimed but never sent.
+
+    Used at shutdown so the next start arms them again instead of treating
+    them as delivered.
+    """
+    if keys:
+        await pool.run(_release_reminders, keys)
+
+
+async def prune_deliveries(keep_days: int = 30) -> int:
+    """Drop delivery records for billing dates older than ``keep_days``."""
+    before = (date.today() - timedelta(days=keep_days)).isoformat()
+    return await pool.run(_prune_deliveries, before)
@@ -0,0 +1,223 @@
+"""Concurrent, rate-limited delivery of reminder messages.
+
+Reminders handed over by the scheduler are queued and sent by a bounded pool
+of workers that share a global token bucket (Telegram allows roughly 30
+messages per second per bot) and keep at most one message per second per
+chat.  Flood-control errors pause every worker for the ``retry_after`` the
+API asked for; other failures are retried with backoff.  Either way a
+reminder ends up in the dead-letter table once it runs out of attempts.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import db
+from db import DueSubscription
+
+logger = logging.getLogger(__name__)
+
+REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", "8"))
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT", "30"))     # messages/second, all chats
+PER_CHAT_INTERVAL = float(os.getenv("PER_CHAT_INTERVAL", "1.0"))        # seconds between messages to one chat
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+
+SendFn = Callable[[DueSubscription, int, int], Awaitable[None]]
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def drain(self) -> None:
+        """Drop all saved-up tokens, e.g. after the API asked us to slow down."""
+        self._tokens = 0
+        self._updated = time.monotonic()
+
+
+@dataclass(eq=False)
+class _Job:
+    sub: DueSubscription
+    offset: int
+    today: int
+    attempts: int = 0
+    sending: bool = False
+
+    @property
+    def key(self) -> tuple:
+        """The reminder's ``reminder_deliveries`` key."""
+        return (self.sub.user_id, self.sub.id, self.sub.next_billing_date, self.offset)
+
+
+class ReminderDispatcher:
+    """Worker pool that delivers queued reminders within Telegram's limits."""
+
+    def __init__(self, send: SendFn, *,
+                 workers: int = REMINDER_WORKERS,
+                 rate: float = TELEGRAM_RATE_LIMIT,
+                 per_chat_interval: float = PER_CHAT_INTERVAL,
+                 max_attempts: int = REMINDER_MAX_ATTEMPTS,
+                 permanent_errors: tuple[type[BaseException], ...] = ()) -> None:
+        self._send = send
+        self._workers = max(1, workers)
+        self._bucket = TokenBucket(rate)
+        self._per_chat_interval = per_chat_interval
+        self._max_attempts = max_attempts
+        self._permanent_errors = permanent_errors
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=self._workers * 100)
+        self._next_slot: dict[int, float] = {}
+        self._paused_until = 0.0
+        self._tasks: list[asyncio.Task] = []
+        self._pending_retries: set[asyncio.Task] = set()
+        # Claimed jobs dropped by stop() before their send started.
+        self._unsent: list[_Job] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers and release the claims of reminders left unsent.
+
+        Queued, waiting-to-retry and not-yet-started jobs were already claimed
+        in the delivery log by the scheduler; releasing them lets the next
+        start send them instead of skipping them as delivered.
+        """
+        for task in (*self._tasks, *self._pending_retries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._pending_retries, return_exceptions=True)
+        self._tasks.clear()
+        self._pending_retries.clear()
+        while not self._queue.empty():
+            self._unsent.append(self._queue.get_nowait())
+            self._queue.task_done()
+        unsent, self._unsent = self._unsent, []
+        if unsent:
+            try:
+                await db.release_reminders([job.key for job in unsent])
+                logger.info(f"Released {len(unsent)} unsent reminder(s) for the next start")
+            except Exception as e:
+                logger.error(f"Could not release {len(unsent)} unsent reminder(s): {e}")
+
+    async def submit(self, sub: DueSubscription, offset: int, today: int) -> None:
+        """Queue a reminder; waits if the queue is full so the scheduler backs off."""
+        await self._queue.put(_Job(sub, offset, today))
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    # ── Rate limiting ────────────────────────────────────────────────────────
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        while True:
+            now = time.monotonic()
+            wait = max(self._paused_until, self._next_slot.get(chat_id, 0.0)) - now
+            if wait <= 0:
+                break
+            # Capped so a chat held by another worker is re-checked.
+            await asyncio.sleep(min(wait, self._per_chat_interval))
+        # Hold the chat while waiting for a token so no other worker can pass
+        # the check above for it in the meantime.
+        self._next_slot[chat_id] = math.inf
+        try:
+            await self._bucket.acquire()
+        finally:
+            self._next_slot[chat_id] = time.monotonic() + self._per_chat_interval
+        if len(self._next_slot) > 10_000:
+            now = time.monotonic()
+            self._next_slot = {k: v for k, v in self._next_slot.items() if v > now}
+
+    # ── Delivery ─────────────────────────────────────────────────────────────
+    def _retry_later(self, job: _Job, delay: float) -> None:
+        job.sending = False
+        async def requeue() -> None:
+            try:
+                await asyncio.sleep(delay)
+                await self._queue.put(job)
+            except asyncio.CancelledError:
+                self._unsent.append(job)
+                raise
+
+        task = asyncio.create_task(requeue())
+        self._pending_retries.add(task)
+        task.add_done_callback(self._pending_retries.discard)
+
+    async def _dead_letter(self, job: _Job, error: BaseException) -> None:
+        self.failed += 1
+        sub = job.sub
+        logger.warning(
+            f"Reminder to {sub.user_id} for '{sub.name}' failed after "
+            f"{job.attempts} attempt(s): {error}"
+        )
+        try:
+            await db.add_dead_letter(sub.user_id, sub.id, sub.next_billing_date,
+                                     job.offset, job.attempts, str(error))
+        except Exception as e:
+            logger.error(f"Could not record dead letter for {sub.user_id}: {e}")
+
+    async def _deliver(self, job: _Job) -> None:
+        chat_id = job.sub.user_id
+        await self._wait_for_slot(chat_id)
+        job.attempts += 1
+        job.sending = True
+        try:
+            await self._send(job.sub, job.offset, job.today)
+        except self._permanent_errors as e:
+            await self._dead_letter(job, e)
+            return
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                # Flood control applies to the whole bot: pause every worker.
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self._bucket.drain()
+            # A flood-limited attempt counts too, so a chat that is limited
+            # over and over is given up on rather than retried forever.
+            if job.attempts >= self._max_attempts:
+                await self._dead_letter(job, e)
+                return
+            delay = 0.0 if retry_after is not None else min(300.0, 2.0 ** job.attempts)
+            self.retried += 1
+            self._retry_later(job, delay)
+            return
+        self.sent += 1
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            except asyncio.CancelledError:
+                # A send that had started may have gone out; keep its claim
+                # so it is not sent twice.
+                if not job.sending:
+                    self._unsent.append(job)
+                raise
+            except Exception as e:
+                logger.error(f"Reminder dispatcher error: {e}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,215 @@
+"""In-memory SubscriptionManagers for bot users, backed by the SQLite store.
+
+A user's subscriptions are loaded into a ``SubscriptionManager`` the first
+time they are needed, so search, sorting and reminder logic run in memory.
+Changes made through ``edit()`` are diffed against what was loaded and written
+back in one transaction.  Managers are kept in an LRU and dropped once idle;
+they never hold unsaved changes, so eviction needs no write.
+
+The bot schema has no notion of a cancelled subscription: cancelling one in
+a manager removes its row, and undoing the cancel writes it back.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Iterable, NamedTuple
+
+import db
+from subscription_manager import Subscription, SubscriptionManager
+
+logger = logging.getLogger(__name__)
+
+MANAGER_CACHE_SIZE = int(os.getenv("MANAGER_CACHE_SIZE", "1000"))
+MANAGER_IDLE_TTL = float(os.getenv("MANAGER_IDLE_TTL", "900"))
+
+
+class _Extra(NamedTuple):
+    """Stored columns the manager's ``Subscription`` does not model."""
+
+    notes: str | None
+    is_free_trial: int
+    created_at: str
+
+
+def row_to_subscription(row: tuple) -> tuple[Subscription, _Extra]:
+    """Map a ``db._SELECT_USER_ROWS`` row onto the manager's model."""
+    (sub_id, name, category, amount, currency, cycle_type, cycle_value,
+     billing_date, reminder_days, notes, is_free_trial, created_at) = row
+    sub = Subscription(
+        id=sub_id,
+        name=name,
+        category=category,
+        price=amount,
+        renewal_date=datetime.fromisoformat(billing_date[:10]),
+        billing_cycle=cycle_type,
+        billing_cycle_value=cycle_value,
+        reminder_days_before=reminder_days,
+        currency=currency,
+    )
+    return sub, _Extra(notes, is_free_trial, created_at)
+
+
+def subscription_to_row(user_id: int, sub: Subscription, extra: _Extra | None) -> tuple:
+    """The ``db._UPSERT_SUBSCRIPTION`` parameters for ``sub``."""
+    if extra is None:
+        extra = _Extra(None, 0, datetime.utcnow().isoformat())
+    billing = sub.renewal_date.date()
+    return (
+        sub.id, user_id, sub.name, sub.category, float(sub.price), sub.currency,
+        sub.billing_cycle, sub.billing_cycle_value, billing.isoformat(),
+        sub.reminder_days_before, extra.notes, extra.is_free_trial, extra.created_at,
+        db.to_epoch_day(billing), billing.day,
+    )
+
+
+class _Entry:
+    __slots__ = ("manager", "version", "saved", "extras", "lock", "used")
+
+    def __init__(self, manager: SubscriptionManager, version: int,
+                 saved: dict[str, Subscription], extras: dict[str, _Extra]) -> None:
+        self.manager = manager
+        self.version = version
+        # What the database holds, by id; subscriptions are immutable, so an
+        # identity check against the manager finds every change.
+        self.saved = saved
+        self.extras = extras
+        self.lock = asyncio.Lock()
+        self.used = time.monotonic()
+
+
+class ManagerStore:
+    """LRU of per-user SubscriptionManagers with write-back to the database."""
+
+    def __init__(self, maxsize: int = MANAGER_CACHE_SIZE, idle_ttl: float = MANAGER_IDLE_TTL) -> None:
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._loading: dict[int, asyncio.Task] = {}
+        # Bumped on every invalidation; a load that raced with one is not cached.
+        self.generation = 0
+        self.loads = 0
+        self.writes = 0
+        self.conflicts = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _load(self, user_id: int) -> tuple[_Entry, bool]:
+        generation = self.generation
+        version, rows = await db.load_user_subscriptions(user_id)
+        saved: dict[str, Subscription] = {}
+        extras: dict[str, _Extra] = {}
+        for row in rows:
+            sub, extra = row_to_subscription(row)
+            saved[sub.id] = sub
+            extras[sub.id] = extra
+        manager = SubscriptionManager()
+        manager.add_many(saved.values())
+        manager.undo_log.clear()
+        self.loads += 1
+        return _Entry(manager, version, saved, extras), generation == self.generation
+
+    async def _entry(self, user_id: int) -> _Entry:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            # Concurrent requests for the same user share one load.
+            task = self._loading.get(user_id)
+            if task is None:
+                task = self._loading[user_id] = asyncio.create_task(self._load(user_id))
+                task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+            entry, fresh = await task
+            if not fresh:
+                return entry
+            entry = self._entries.setdefault(user_id, entry)
+        entry.used = time.monotonic()
+        self._entries.move_to_end(user_id)
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._entries:
+            user_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.maxsize and entry.used >= cutoff:
+                break
+            if entry.lock.locked():
+                # Mid-edit; it is about to be used, so move it out of the way.
+                entry.used = time.monotonic()
+                self._entries.move_to_end(user_id)
+                if len(self._entries) <= self.maxsize:
+                    break
+                continue
+            del self._entries[user_id]
+
+    async def get(self, user_id: int) -> SubscriptionManager:
+        """The user's manager, for reading.  Use ``edit()`` to change it."""
+        return (await self._entry(user_id)).manager
+
+    @asynccontextmanager
+    async def edit(self, user_id: int) -> AsyncIterator[SubscriptionManager]:
+        """Yield the user's manager and save whatever changed when the block exits.
+
+        Edits for one user are serialised.  If the rows were changed through
+        the sync API meanwhile, ``db.VersionConflict`` is raised and the
+        manager is dropped so the next access reloads it.
+        """
+        entry = await self._entry(user_id)
+        async with entry.lock:
+            try:
+                yield entry.manager
+            except BaseException:
+                self.invalidate(user_id)
+                raise
+            await self._save(user_id, entry)
+
+    async def _save(self, user_id: int, entry: _Entry) -> None:
+        current = {sub.id: sub for sub in entry.manager.subscriptions if not sub.cancelled}
+        upserts = [sub for sub_id, sub in current.items() if entry.saved.get(sub_id) is not sub]
+        deletes = [sub_id for sub_id in entry.saved if sub_id not in current]
+        if not upserts and not deletes:
+            return
+        rows = [subscription_to_row(user_id, sub, entry.extras.get(sub.id)) for sub in upserts]
+        try:
+            entry.version = await db.save_user_subscriptions(user_id, entry.version, rows, deletes)
+        except db.VersionConflict:
+            self.conflicts += 1
+            self.invalidate(user_id)
+            raise
+        except BaseException:
+            self.invalidate(user_id)
+            raise
+        self.writes += 1
+        entry.saved = current
+        # Extras of deleted rows are kept so an undo writes them back unchanged.
+        for sub, row in zip(upserts, rows):
+            entry.extras.setdefault(sub.id, _Extra(row[10], row[11], row[12]))
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """Drop cached managers, e.g. after rows were written by the sync API."""
+        self.generation += 1
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        self.generation += 1
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "loads": self.loads,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+        }
+
+
+manager_store = ManagerStore()
@@ -0,0 +1,158 @@
+"""Diagnosing event-loop stalls in the running bot.
+
+``LoopWatchdog`` keeps a heartbeat on the event loop and a watcher thread
+beside it.  When the heartbeat is more than ``LOOP_STALL_THRESHOLD`` seconds
+late the loop is stuck in some synchronous call, and the watcher logs the
+loop thread's current stack (and the task running it) while the stall is
+still in progress, so the offending call is named rather than guessed at.
+
+``SamplingProfiler`` samples every thread's stack at a fixed rate for a few
+seconds and writes the counts in collapsed-stack format (one
+``frame;frame;frame count`` line per stack), which flamegraph.pl, speedscope
+and similar tools read directly.  The bot exposes it on an admin endpoint so
+a production process can be profiled without restarting it.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+
+from metrics import LOOP_LAG_SECONDS, registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.25"))   # seconds
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_HZ = int(os.getenv("PROFILE_HZ", "100"))
+
+STALLS = registry.counter(
+    "yodda_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than LOOP_STALL_THRESHOLD",
+)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    # The function's first line rather than the current one, so samples
+    # anywhere in a function add up to one frame.
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class LoopWatchdog:
+    """Logs the stack of whatever blocks the event loop for too long."""
+
+    def __init__(self, threshold: float = LOOP_STALL_THRESHOLD, interval: float | None = None) -> None:
+        self.threshold = threshold
+        self.interval = interval if interval is not None else max(0.01, threshold / 4)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread = 0
+        self._beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stalls = 0
+        self.longest = 0.0
+
+    async def run(self) -> None:
+        """Heartbeat on the loop; also records ``yodda_event_loop_lag_seconds``."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="yodda-watchdog", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self._beat = now = time.monotonic()
+                LOOP_LAG_SECONDS.observe(max(0.0, now - started - self.interval))
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        stalled_since = None
+        while not self._stop.wait(self.interval):
+            late = time.monotonic() - self._beat - self.interval
+            if late <= self.threshold:
+                if stalled_since is not None:
+                    duration = time.monotonic() - stalled_since
+                    self.longest = max(self.longest, duration)
+                    logger.warning(f"Event loop unblocked after ~{duration:.2f}s")
+                    stalled_since = None
+                continue
+            if stalled_since is not None:
+                continue
+            # Report each stall once, while it is still happening.
+            stalled_since = self._beat + self.interval
+            self.stalls += 1
+            STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self._loop) if self._loop is not None else None
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  <unavailable>\n"
+            logger.warning(
+                f"Event loop blocked for {late:.2f}s"
+                + (f" in task {task.get_name()}" if task is not None else "")
+                + f"; loop thread stack:\n{stack}"
+            )
+
+
+class SamplingProfiler:
+    """Samples all thread stacks and writes them in collapsed-stack format."""
+
+    def __init__(self, directory: str = PROFILE_DIR, hz: int = PROFILE_HZ) -> None:
+        self.directory = directory
+        self.hz = max(1, hz)
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float) -> tuple[str, int]:
+        """Sample for ``seconds`` (blocking) and return ``(path, samples)``.
+
+        Raises ``RuntimeError`` if a profile is already being taken.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("a profile is already running")
+        try:
+            stacks = self._sample(min(seconds, PROFILE_MAX_SECONDS))
+        finally:
+            self._lock.release()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path, sum(stacks.values())
+
+    def _sample(self, seconds: float) -> Counter:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        period = 1.0 / self.hz
+        deadline = time.monotonic() + seconds
+        next_at = time.monotonic()
+        while next_at < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                frames.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(frames))] += 1
+            next_at += period
+            time.sleep(max(0.0, next_at - time.monotonic()))
+        return stacks
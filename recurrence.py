@@ -0,0 +1,152 @@
+"""Billing-cycle arithmetic shared by the bot and the subscription manager.
+
+A cycle is a ``(billing_cycle_type, billing_cycle_value)`` pair as stored in
+the ``subscriptions`` table: ``("monthly", 3)`` renews every three months,
+``("weekly", 2)`` every fortnight.  Month-based cycles keep the billing day of
+month and clamp it to the month's length (31 Jan + 1 month is 28/29 Feb).
+
+Renewal dates are computed directly from the number of elapsed cycles rather
+than by stepping one cycle at a time, so bringing a date that is years stale
+up to today costs the same as one step.  ``advance_many`` does the same for
+whole columns of epoch days, vectorised with NumPy when it is installed.
+"""
+
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from typing import Sequence, TypeVar
+
+try:
+    import numpy as np
+except ImportError:  # bulk helpers fall back to plain loops
+    np = None
+
+D = TypeVar("D", date, datetime)
+
+# Unit of each cycle type: (months per unit, days per unit).  Unknown types
+# are treated as monthly, as they always have been.
+CYCLE_UNITS: dict[str, tuple[int, int]] = {
+    "daily": (0, 1),
+    "custom": (1, 0),       # the mini app bills and renews "custom" monthly
+    "weekly": (0, 7),
+    "monthly": (1, 0),
+    "quarterly": (3, 0),
+    "yearly": (12, 0),
+}
+
+# Days in an average month, used for both day- and week-based cycles (the
+# spending dashboard in the mini app uses the same figure).
+_DAYS_PER_MONTH = 365 / 12
+
+# Monthly cost multipliers per unit.
+_UNIT_MONTHLY_FACTOR: dict[str, float] = {
+    "daily": _DAYS_PER_MONTH,
+    "custom": 1.0,
+    "weekly": _DAYS_PER_MONTH / 7,
+    "monthly": 1.0,
+    "quarterly": 1 / 3,
+    "yearly": 1 / 12,
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def cycle_step(cycle_type: str, value: int = 1) -> tuple[int, int]:
+    """``(months, days)`` between renewals; exactly one of them is non-zero."""
+    months, days = CYCLE_UNITS.get(cycle_type, (1, 0))
+    value = max(1, int(value or 1))
+    return months * value, days * value
+
+
+def monthly_factor(cycle_type: str, value: int = 1) -> float:
+    """Multiplier turning one charge into a monthly cost."""
+    return _UNIT_MONTHLY_FACTOR.get(cycle_type, 1.0) / max(1, int(value or 1))
+
+
+def add_months(d: D, months: int, anchor_day: int | None = None) -> D:
+    """``d`` moved by ``months``, on ``anchor_day`` (default ``d.day``) clamped to the month."""
+    index = d.year * 12 + d.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    day = min(anchor_day or d.day, monthrange(year, month)[1])
+    return d.replace(year=year, month=month, day=day)
+
+
+def nth_renewal(start: D, cycle_type: str, value: int, n: int, anchor_day: int | None = None) -> D:
+    """The ``n``-th renewal after ``start`` (``n = 0`` is ``start`` itself)."""
+    months, days = cycle_step(cycle_type, value)
+    if months:
+        return add_months(start, months * n, anchor_day)
+    return start + timedelta(days=days * n)
+
+
+def next_renewals(start: D, cycle_type: str, value: int, count: int,
+                  anchor_day: int | None = None) -> list[D]:
+    """The first ``count`` renewal dates starting with ``start``."""
+    return [nth_renewal(start, cycle_type, value, n, anchor_day) for n in range(count)]
+
+
+def advance(start: D, cycle_type: str, value: int, until: D, anchor_day: int | None = None) -> D:
+    """The first renewal on or after ``until``; ``start`` itself if it is not stale."""
+    if start >= until:
+        return start
+    months, days = cycle_step(cycle_type, value)
+    if months:
+        elapsed = (until.year - start.year) * 12 + until.month - start.month
+        n = max(0, -(-elapsed // months))
+        renewal = add_months(start, months * n, anchor_day)
+        return renewal if renewal >= until else add_months(start, months * (n + 1), anchor_day)
+    n = -(-(until - start).days // days)
+    renewal = nth_renewal(start, cycle_type, value, n)
+    return renewal if renewal >= until else nth_renewal(start, cycle_type, value, n + 1)
+
+
+def advance_many(days: Sequence[int], cycle_types: Sequence[str], cycle_values: Sequence[int],
+                 today: int, anchor_days: Sequence[int | None] | None = None) -> list[int]:
+    """``advance`` over columns of epoch days; returns the new epoch days.
+
+    ``anchor_days`` holds each row's billing day of month (``None`` for the
+    day of its current date), so a date clamped to a short month goes back
+    to the 31st when the next month has one.
+    """
+    if anchor_days is None:
+        anchor_days = [None] * len(days)
+    if np is None or len(days) < 64:
+        until = date.fromordinal(today + _EPOCH_ORDINAL)
+        return [
+            advance(date.fromordinal(day + _EPOCH_ORDINAL), cycle_type, value, until, anchor).toordinal()
+            - _EPOCH_ORDINAL
+            for day, cycle_type, value, anchor in zip(days, cycle_types, cycle_values, anchor_days)
+        ]
+
+    steps = np.array([cycle_step(t, v) for t, v in zip(cycle_types, cycle_values)], dtype="int64")
+    step_months, step_days = steps[:, 0], steps[:, 1]
+    start = np.asarray(days, dtype="int64")
+    result = start.copy()
+
+    stale = start < today
+    by_days = stale & (step_days > 0)
+    if by_days.any():
+        s, n = start[by_days], step_days[by_days]
+        result[by_days] = s + (-(-(today - s) // n)) * n
+
+    by_months = stale & (step_months > 0)
+    if by_months.any():
+        s, n = start[by_months], step_months[by_months]
+        dates = s.astype("datetime64[D]")
+        month0 = dates.astype("datetime64[M]")
+        day_of_month = (dates - month0).astype("int64")
+        anchor = np.array([a or 0 for a in anchor_days], dtype="int64")[by_months]
+        day_of_month = np.where(anchor > 0, anchor - 1, day_of_month)
+        today_month = np.datetime64(today, "D").astype("datetime64[M]")
+        elapsed = (today_month - month0).astype("int64")
+        k = np.maximum(0, -(-elapsed // n))
+
+        def renewal(k):
+            month = month0 + k * n
+            length = ((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")).astype("int64")
+            return (month.astype("datetime64[D]") + np.minimum(day_of_month, length - 1)).astype("int64")
+
+        candidate = renewal(k)
+        result[by_months] = np.where(candidate >= today, candidate, renewal(k + 1))
+
+    return result.tolist()
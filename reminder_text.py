@@ -0,0 +1,104 @@
+"""Rendering of reminder messages.
+
+Templates from ``REMINDER_TRANSLATIONS`` are compiled once per language (title
+and body joined, ``str.format`` pre-bound), and the pieces that repeat across
+many reminders — formatted dates, amounts and "N days" phrases — are memoised,
+so rendering a large batch mostly costs one ``format`` call per message.
+"""
+
+from functools import lru_cache
+from typing import Callable
+
+from db import DueSubscription, from_epoch_day
+
+REMINDER_TRANSLATIONS = {
+    "en": {
+        "title":    "⏰ Upcoming Renewal",
+        "body":     "Your <b>{name}</b> subscription renews in <b>{days}</b> ({date}) for <b>{amount} {currency}</b>.",
+        "trial":    "🆓 <b>{name}</b> free trial ends in <b>{days}</b> ({date}). It will charge <b>{amount} {currency}</b>.",
+        "today":    "Your <b>{name}</b> subscription renews <b>today</b> for <b>{amount} {currency}</b>.",
+        "trial_today": "🆓 <b>{name}</b> free trial ends <b>today</b>. Charge: <b>{amount} {currency}</b>.",
+    },
+    "ru": {
+        "title":    "⏰ Предстоящее списание",
+        "body":     "Подписка <b>{name}</b> продлится через <b>{days}</b> ({date}) на сумму <b>{amount} {currency}</b>.",
+        "trial":    "🆓 Пробный период <b>{name}</b> заканчивается через <b>{days}</b> ({date}). С вас спишут <b>{amount} {currency}</b>.",
+        "today":    "Подписка <b>{name}</b> продлевается <b>сегодня</b> на сумму <b>{amount} {currency}</b>.",
+        "trial_today": "🆓 Пробный период <b>{name}</b> заканчивается <b>сегодня</b>. Спишется <b>{amount} {currency}</b>.",
+    },
+    "uz": {
+        "title":    "⏰ Yaqinlashayotgan to'lov",
+        "body":     "<b>{name}</b> obunangiz <b>{days}</b> ichida ({date}) <b>{amount} {currency}</b> miqdorida yangilanadi.",
+        "trial":    "🆓 <b>{name}</b> sinov muddati <b>{days}</b> ichida ({date}) tugaydi. <b>{amount} {currency}</b> hisobdan chiqariladi.",
+        "today":    "<b>{name}</b> obunangiz <b>bugun</b> <b>{amount} {currency}</b> miqdorida yangilanadi.",
+        "trial_today": "🆓 <b>{name}</b> sinov muddati <b>bugun</b> tugaydi. <b>{amount} {currency}</b> hisobdan chiqariladi.",
+    },
+}
+
+
+def _days_en(n: int) -> str:
+    return f"{n} day" if n == 1 else f"{n} days"
+
+
+def _days_ru(n: int) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        word = "день"
+    elif 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        word = "дня"
+    else:
+        word = "дней"
+    return f"{n} {word}"
+
+
+def _days_uz(n: int) -> str:
+    # Uzbek nouns stay singular after a numeral.
+    return f"{n} kun"
+
+
+_PLURALS: dict[str, Callable[[int], str]] = {"en": _days_en, "ru": _days_ru, "uz": _days_uz}
+
+
+@lru_cache(maxsize=128)
+def format_days(lang: str, days: int) -> str:
+    return _PLURALS.get(lang, _days_en)(days)
+
+
+@lru_cache(maxsize=1024)
+def format_date(billing_day: int) -> str:
+    return from_epoch_day(billing_day).strftime("%-d %b")     # e.g. "4 Mar"
+
+
+@lru_cache(maxsize=4096)
+def format_amount(amount: float) -> str:
+    return f"{amount:.2f}".rstrip("0").rstrip(".")
+
+
+class _CompiledTemplates:
+    __slots__ = ("body", "trial", "today", "trial_today")
+
+    def __init__(self, msgs: dict) -> None:
+        prefix = msgs["title"].replace("{", "{{").replace("}", "}}") + "\n\n"
+        for kind in self.__slots__:
+            setattr(self, kind, (prefix + msgs[kind]).format)
+
+
+_COMPILED = {lang: _CompiledTemplates(msgs) for lang, msgs in REMINDER_TRANSLATIONS.items()}
+
+
+def render_reminder(sub: DueSubscription, today: int) -> str:
+    """Render the reminder text for ``sub``; ``today`` is the current epoch day.
+
+    Callers rendering many reminders should compute ``today`` once per batch.
+    """
+    lang = sub.language if sub.language in _COMPILED else "en"
+    templates = _COMPILED[lang]
+    days = sub.billing_day - today
+    amount = format_amount(sub.amount)
+
+    if days <= 0:
+        template = templates.trial_today if sub.is_free_trial else templates.today
+        return template(name=sub.name, amount=amount, currency=sub.currency)
+
+    template = templates.trial if sub.is_free_trial else templates.body
+    return template(name=sub.name, days=format_days(lang, days), date=format_date(sub.billing_day),
+                    amount=amount, currency=sub.currency)
@@ -0,0 +1,226 @@
+"""Reminder scheduler for the Yodda bot.
+
+Pending reminders live in a min-heap ordered by fire time.  The scheduler
+sleeps until the earliest one is due (or until a sync changes a user's
+subscriptions) instead of polling, so reminders go out on time and each
+wake-up only touches the reminders that are actually due.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Iterable
+
+import db
+from db import DueSubscription, from_epoch_day, to_epoch_day
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# How far ahead (by billing date) the daily refresh scans; it must cover the
+# longest reminder_days in use.  Only reminders firing before the next refresh
+# are kept in memory.
+REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", "31"))
+# Local time of day at which a reminder for a given date is sent.
+REMINDER_TIME = time.fromisoformat(os.getenv("REMINDER_TIME", "09:00"))
+
+RUN_SECONDS = registry.histogram(
+    "yodda_scheduler_run_seconds",
+    "Duration of scheduler passes: the daily refresh and each dispatch of due reminders",
+    ("phase",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0),
+)
+
+# (user_id, subscription id, billing date, days before billing)
+ReminderKey = tuple[int, str, str, int]
+# send(subscription, offset, today as an epoch day)
+SendFn = Callable[[DueSubscription, int, int], Awaitable[None]]
+
+
+def reminder_offsets(sub: DueSubscription) -> list[int]:
+    """Days before the billing date at which a subscription is reminded.
+
+    One reminder at the user's chosen ``reminder_days`` and one on the day
+    itself.
+    """
+    days = max(0, sub.reminder_days)
+    return [days, 0] if days else [0]
+
+
+def reminder_key(sub: DueSubscription, offset: int) -> ReminderKey:
+    return (sub.user_id, sub.id, sub.next_billing_date, offset)
+
+
+def fire_time(billing_date: date, offset: int) -> datetime:
+    return datetime.combine(billing_date - timedelta(days=offset), REMINDER_TIME)
+
+
+class ReminderScheduler:
+    """Heap of upcoming reminders with lazy invalidation.
+
+    Each heap entry carries a sequence number; rescheduling a user simply
+    records new sequence numbers in ``_live`` and stale heap entries are
+    discarded when they reach the top.
+
+    Only reminders that fire before the next daily refresh are armed, and
+    only their keys are held: the subscription rows are read again when the
+    reminders fire.  Memory therefore follows one day's reminders, not every
+    subscription billing within the horizon.
+    """
+
+    def __init__(self, send: SendFn,
+                 on_advanced: Callable[[Iterable[int]], None] | None = None) -> None:
+        self._send = send
+        # Told which users had billing dates rolled forward by the daily pass.
+        self._on_advanced = on_advanced
+        self._heap: list[tuple[datetime, int, ReminderKey]] = []
+        self._seq = itertools.count()
+        self._live: dict[ReminderKey, int] = {}
+        self._by_user: dict[int, set[ReminderKey]] = {}
+        self._changed = asyncio.Event()
+        self._next_refresh = datetime.min
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    # ── Building the heap ────────────────────────────────────────────────────
+    def _arm(self, sub: DueSubscription, now: datetime) -> None:
+        billing = from_epoch_day(sub.billing_day)
+        offsets = reminder_offsets(sub)
+        delivered = {int(o) for o in str(sub.delivered_offsets or "").split(",") if o}
+        for i, offset in enumerate(offsets):
+            if offset in delivered:
+                continue
+            # Billing dates repeat across many rows; share one string per date.
+            key = (sub.user_id, sub.id, sys.intern(sub.next_billing_date), offset)
+            # Catching up after downtime: if a closer reminder for the same
+            # billing date is due today, skip this one rather than sending both.
+            if any(billing - timedelta(days=later) <= now.date() for later in offsets[i + 1:]):
+                continue
+            fire_at = fire_time(billing, offset)
+            if fire_at >= self._next_refresh:
+                # Armed by the refresh that runs before it is due.
+                continue
+            seq = next(self._seq)
+            self._live[key] = seq
+            self._by_user.setdefault(sub.user_id, set()).add(key)
+            heapq.heappush(self._heap, (fire_at, seq, key))
+
+    def _drop_user(self, user_id: int) -> None:
+        for key in self._by_user.pop(user_id, ()):
+            self._live.pop(key, None)
+
+    async def rebuild(self) -> None:
+        """Reload every reminder within the horizon from the database."""
+        now = datetime.now()
+        self._heap.clear()
+        self._live.clear()
+        self._by_user.clear()
+        self._next_refresh = datetime.combine(now.date() + timedelta(days=1), time())
+        async for sub in db.iter_due_subscriptions(within_days=REMINDER_HORIZON_DAYS):
+            self._arm(sub, now)
+        logger.info(f"⏰ Reminder heap rebuilt: {len(self._live)} pending")
+        self._changed.set()
+
+    async def reschedule_user(self, user_id: int) -> None:
+        """Replace one user's pending reminders after their subscriptions changed."""
+        subs = await db.get_user_due_subscriptions(user_id, within_days=REMINDER_HORIZON_DAYS)
+        now = datetime.now()
+        self._drop_user(user_id)
+        for sub in subs:
+            self._arm(sub, now)
+        self._changed.set()
+
+    # ── Running ──────────────────────────────────────────────────────────────
+    def _peek(self) -> tuple[datetime, int, ReminderKey] | None:
+        while self._heap:
+            fire_at, seq, key = self._heap[0]
+            if self._live.get(key) == seq:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> list[ReminderKey]:
+        """Remove and return the keys of every due reminder."""
+        due: list[ReminderKey] = []
+        while True:
+            head = self._peek()
+            if head is None or head[0] > now:
+                break
+            heapq.heappop(self._heap)
+            key = head[2]
+            del self._live[key]
+            keys = self._by_user.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[key[0]]
+            due.append(key)
+        return due
+
+    async def _dispatch(self, due: list[ReminderKey], today: int) -> None:
+        # Reminders whose row has gone or moved to another billing date since
+        # they were armed are dropped; a reschedule has armed the new ones.
+        rows = await db.get_reminder_subscriptions(due)
+        due = [key for key in due if key[:3] in rows]
+        if not due:
+            return
+        # One bulk check against the delivery log; anything already sent
+        # (e.g. before a restart) is dropped here.
+        claiming = asyncio.ensure_future(db.claim_reminders(due))
+        claimed: list[ReminderKey] | None = None
+        handed_over = 0
+        try:
+            keys = await asyncio.shield(claiming)
+            claimed = [key for key in due if key in keys]
+            for key in claimed:
+                await self._send(rows[key[:3]], key[3], today)
+                handed_over += 1
+        except asyncio.CancelledError:
+            # Shutting down: give back the claims of reminders that were not
+            # handed over, so the next start sends them.
+            if claimed is None:
+                keys = await claiming
+                claimed = [key for key in due if key in keys]
+            await db.release_reminders(claimed[handed_over:])
+            raise
+
+    async def run(self) -> None:
+        while True:
+            try:
+                now = datetime.now()
+                if now >= self._next_refresh:
+                    with RUN_SECONDS.time("refresh"):
+                        advanced = await db.advance_billing_dates()
+                        if advanced:
+                            logger.info(f"⏰ Rolled billing dates forward for {len(advanced)} user(s)")
+                            if self._on_advanced is not None:
+                                self._on_advanced(advanced)
+                        await db.prune_deliveries()
+                        await self.rebuild()
+
+                due = self.pop_due(now)
+                if due:
+                    with RUN_SECONDS.time("dispatch"):
+                        await self._dispatch(due, to_epoch_day(now.date()))
+
+                head = self._peek()
+                wake = self._next_refresh if head is None else min(head[0], self._next_refresh)
+                self._changed.clear()
+                timeout = max(0.0, (wake - datetime.now()).total_seconds())
+                # Not wait_for: on 3.11 it can swallow a cancel that arrives
+                # just as _changed is set, and shutdown would hang.
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self._changed.wait()
+                except TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reminder scheduler error: {e}")
+                await asyncio.sleep(60)
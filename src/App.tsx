@@ -10,7 +10,7 @@ import { useThemeStore } from "./lib/useThemeStore";
 import { useLanguageStore, type Language } from "./lib/useLanguageStore";
 import { getTranslations } from "./lib/translations";
 import { useSubStore } from "./features/subs/useSubStore";
-import { syncSubscriptionsNow } from "./lib/syncSubscriptions";
+import { fetchSubscriptions, syncSubscriptionsNow } from "./lib/syncSubscriptions";
 
 function App() {
   const { theme } = useThemeStore();
@@ -18,9 +18,18 @@ function App() {
   const t = getTranslations(language);
   const { subscriptions } = useSubStore();
 
-  // Sync subscriptions to backend on first load so the bot has up-to-date data
+  // On first load, restore the stored list on a device that has none yet;
+  // otherwise sync ours so the bot has up-to-date data
   useEffect(() => {
-    void syncSubscriptionsNow(subscriptions);
+    if (subscriptions.length > 0) {
+      void syncSubscriptionsNow(subscriptions);
+      return;
+    }
+    void fetchSubscriptions().then((stored) => {
+      if (stored && stored.length > 0 && useSubStore.getState().subscriptions.length === 0) {
+        useSubStore.setState({ subscriptions: stored });
+      }
+    });
   // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []); // intentionally run once on mount
 
@@ -6,6 +6,9 @@ import { cn } from "../../lib/utils";
 import { useLanguageStore } from "../../lib/useLanguageStore";
 import { getTranslations } from "../../lib/translations";
 
+// An average month (365 / 12 days), as the bot uses for its totals.
+const WEEKS_PER_MONTH = 365 / 12 / 7;
+
 export function SpendingDashboard() {
     const { subscriptions } = useSubStore();
     const { language } = useLanguageStore();
@@ -19,7 +22,7 @@ export function SpendingDashboard() {
         subscriptions.forEach((sub) => {
             let monthlyAmount = sub.amount;
             if (sub.billing_cycle_type === "weekly") {
-                monthlyAmount = sub.amount * 4;
+                monthlyAmount = sub.amount * WEEKS_PER_MONTH;
             } else if (sub.billing_cycle_type === "yearly") {
                 monthlyAmount = sub.amount / 12;
             }
@@ -41,7 +44,7 @@ export function SpendingDashboard() {
         subscriptions.forEach((sub) => {
             let monthlyAmount = sub.amount;
             if (sub.billing_cycle_type === "weekly") {
-                monthlyAmount = sub.amount * 4;
+                monthlyAmount = sub.amount * WEEKS_PER_MONTH;
             } else if (sub.billing_cycle_type === "yearly") {
                 monthlyAmount = sub.amount / 12;
             }
@@ -8,6 +8,12 @@
  *
  * The sync is debounced — multiple rapid changes are coalesced into one
  * request after a short delay.
+ *
+ * fetchSubscriptions() reads the stored list back, e.g. when the app is opened
+ * on a new device.  It authenticates with the signed Telegram initData rather
+ * than the shared secret, so the server knows whose list to return.  The
+ * server answers with an ETag, so the browser cache revalidates repeat reads
+ * and an unchanged list costs an empty 304.
  */
 
 import type { Subscription } from "../features/subs/useSubStore";
@@ -33,6 +39,12 @@ function getTelegramUserId(): number | null {
     return null;
 }
 
+/** The signed launch data Telegram passes to the Web App, or "" outside Telegram. */
+function getTelegramInitData(): string {
+    const tg = (window as unknown as { Telegram?: { WebApp?: { initData?: string } } }).Telegram?.WebApp;
+    return tg?.initData ?? "";
+}
+
 let _debounceTimer: ReturnType<typeof setTimeout> | null = null;
 
 export function scheduleSyncSubscriptions(subscriptions: Subscription[]): void {
@@ -69,3 +81,26 @@ export async function syncSubscriptionsNow(subscriptions: Subscription[]): Promi
         console.warn("[yodda] Sync request failed (offline?):", err);
     }
 }
+
+/** The user's subscriptions as stored by the backend, or null if unavailable. */
+export async function fetchSubscriptions(): Promise<Subscription[] | null> {
+    const initData = getTelegramInitData();
+    if (!initData) return null;
+
+    const url = `${API_BASE}/api/subscriptions`;
+    const headers: Record<string, string> = { "Authorization": `tma ${initData}` };
+
+    try {
+        const res = await fetch(url, { headers, cache: "no-cache" });
+        if (!res.ok) {
+            console.warn(`[yodda] Fetching subscriptions failed: HTTP ${res.status}`);
+            return null;
+        }
+        const body = await res.json() as { subscriptions: Subscription[] };
+        // The server lists oldest first; the store keeps newest first.
+        return body.subscriptions.reverse();
+    } catch (err) {
+        console.warn("[yodda] Fetching subscriptions failed (offline?):", err);
+        return null;
+    }
+}
@@ -2,12 +2,29 @@ from __future__ import annotations
 
 """Subscription manager using linked list, queue, stack, searching, and sorting."""
 
+import heapq
+import itertools
+import math
+import sys
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-from typing import Callable, Iterable, List, Optional
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from recurrence import advance, cycle_step, monthly_factor, nth_renewal
 
-@dataclass
+try:
+    import numpy as np
+except ImportError:  # analytics fall back to plain loops
+    np = None
+
+
+# Slotted and frozen: no per-instance __dict__, and edits always go through
+# dataclasses.replace, so instances can be shared by the undo stack and indexes.
+@dataclass(frozen=True, slots=True)
 class Subscription:
     id: str
     name: str
@@ -17,9 +34,19 @@ class Subscription:
     billing_cycle: str = "monthly"
     reminder_days_before: int = 3
     cancelled: bool = False
+    currency: str = "USD"
+    # Renews every ``billing_cycle_value`` units of ``billing_cycle``.
+    billing_cycle_value: int = 1
+
+    def __post_init__(self) -> None:
+        # Categories, cycles and currencies repeat across nearly every row.
+        for name in ("category", "billing_cycle", "currency"):
+            value = getattr(self, name)
+            if type(value) is str:
+                object.__setattr__(self, name, sys.intern(value))
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Reminder:
     subscription_id: str
     subscription_name: str
@@ -28,145 +55,752 @@ class Reminder:
 
 
 class LinkedListNode:
+    __slots__ = ("value", "prev", "next")
+
     def __init__(self, value: Subscription) -> None:
         self.value = value
+        self.prev: Optional[LinkedListNode] = None
         self.next: Optional[LinkedListNode] = None
 
 
 class SubscriptionLinkedList:
+    """Doubly linked list in insertion order with an id -> node index.
+
+    The index and tail pointer make append, lookup, update and removal O(1).
+    """
+
     def __init__(self) -> None:
         self.head: Optional[LinkedListNode] = None
+        self.tail: Optional[LinkedListNode] = None
+        self._index: Dict[str, LinkedListNode] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, sub_id: str) -> bool:
+        return sub_id in self._index
+
+    def __iter__(self) -> Iterator[Subscription]:
+        current = self.head
+        while current is not None:
+            yield current.value
+            current = current.next
 
     def append(self, value: Subscription) -> None:
+        if value.id in self._index:
+            raise ValueError(f"duplicate subscription id: {value.id}")
+
         node = LinkedListNode(value)
-        if self.head is None:
+        self._index[value.id] = node
+        if self.tail is None:
             self.head = node
+            self.tail = node
             return
 
-        current = self.head
-        while current.next is not None:
-            current = current.next
-        current.next = node
+        node.prev = self.tail
+        self.tail.next = node
+        self.tail = node
+
+    def insert_after(self, prev_id: Optional[str], value: Subscription) -> None:
+        """Insert ``value`` right after ``prev_id``, or at the head if it is None."""
+        if value.id in self._index:
+            raise ValueError(f"duplicate subscription id: {value.id}")
+
+        prev = None if prev_id is None else self._index[prev_id]
+        node = LinkedListNode(value)
+        node.prev = prev
+        node.next = self.head if prev is None else prev.next
+        if node.next is None:
+            self.tail = node
+        else:
+            node.next.prev = node
+        if prev is None:
+            self.head = node
+        else:
+            prev.next = node
+        self._index[value.id] = node
+
+    def neighbours(self, sub_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Ids before and after ``sub_id``; for None, the position before the head."""
+        if sub_id is None:
+            return None, self.head.value.id if self.head is not None else None
+        node = self._index[sub_id]
+        return (
+            node.prev.value.id if node.prev is not None else None,
+            node.next.value.id if node.next is not None else None,
+        )
 
     def find_by_id(self, sub_id: str) -> Optional[Subscription]:
-        current = self.head
-        while current is not None:
-            if current.value.id == sub_id:
-                return current.value
-            current = current.next
-        return None
+        node = self._index.get(sub_id)
+        return node.value if node is not None else None
 
     def update(self, sub_id: str, updater: Callable[[Subscription], Subscription]) -> bool:
-        current = self.head
-        while current is not None:
-            if current.value.id == sub_id:
-                current.value = updater(current.value)
-                return True
-            current = current.next
-        return False
+        node = self._index.get(sub_id)
+        if node is None:
+            return False
+        updated = updater(node.value)
+        if updated.id != sub_id:
+            if updated.id in self._index:
+                raise ValueError(f"duplicate subscription id: {updated.id}")
+            del self._index[sub_id]
+            self._index[updated.id] = node
+        node.value = updated
+        return True
 
     def remove_by_id(self, sub_id: str) -> Optional[Subscription]:
-        current = self.head
-        previous: Optional[LinkedListNode] = None
+        node = self._index.pop(sub_id, None)
+        if node is None:
+            return None
 
-        while current is not None:
-            if current.value.id == sub_id:
-                removed = current.value
-                if previous is None:
-                    self.head = current.next
-                else:
-                    previous.next = current.next
-                return removed
-            previous = current
-            current = current.next
-        return None
+        if node.prev is None:
+            self.head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self.tail = node.prev
+        else:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+        return node.value
 
     def to_list(self) -> List[Subscription]:
-        result: List[Subscription] = []
-        current = self.head
-        while current is not None:
-            result.append(current.value)
-            current = current.next
-        return result
+        return list(self)
+
+
+class SortedIndex:
+    """Subscription ids kept sorted by ``key`` and updated incrementally.
+
+    Entries are ``(key, seq, id)`` tuples; ``seq`` is the insertion sequence,
+    so equal keys keep insertion order just like a stable ``sorted()``.
+    """
+
+    def __init__(self, key: Callable[[Subscription], Any]) -> None:
+        self.key = key
+        self._items: List[tuple] = []
+        self._entries: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, sub: Subscription, seq: int) -> None:
+        entry = (self.key(sub), seq, sub.id)
+        self._entries[sub.id] = entry
+        insort(self._items, entry)
+
+    def remove(self, sub_id: str) -> None:
+        entry = self._entries.pop(sub_id, None)
+        if entry is not None:
+            del self._items[bisect_left(self._items, entry)]
+
+    def holds(self, sub: Subscription, seq: int) -> bool:
+        return self._entries.get(sub.id) == (self.key(sub), seq, sub.id)
+
+    def replace_many(self, removed: Iterable[str], added: Iterable[Tuple[Subscription, int]]) -> None:
+        """Remove and add many entries, re-sorting once when that is cheaper."""
+        stale = [entry for entry in map(self._entries.pop, removed, itertools.repeat(None)) if entry]
+        fresh = [(self.key(sub), seq, sub.id) for sub, seq in added]
+        for entry in fresh:
+            self._entries[entry[2]] = entry
+        if len(stale) + len(fresh) <= 32:
+            for entry in stale:
+                del self._items[bisect_left(self._items, entry)]
+            for entry in fresh:
+                insort(self._items, entry)
+            return
+        if stale:
+            drop = set(stale)
+            self._items = [entry for entry in self._items if entry not in drop]
+        self._items.extend(fresh)
+        self._items.sort()
 
+    def ids(self) -> Iterator[str]:
+        for _, _, sub_id in self._items:
+            yield sub_id
 
-class Stack:
-    def __init__(self) -> None:
-        self._items: List[tuple[str, Subscription]] = []
+    def range_ids(self, low: Any, high: Any) -> Iterator[str]:
+        """Ids whose key lies in ``[low, high]``, in key order."""
+        start = bisect_left(self._items, (low,))
+        end = bisect_right(self._items, (high, math.inf))
+        for _, _, sub_id in self._items[start:end]:
+            yield sub_id
 
-    def push(self, item: tuple[str, Subscription]) -> None:
-        self._items.append(item)
 
-    def pop(self) -> Optional[tuple[str, Subscription]]:
-        if not self._items:
-            return None
-        return self._items.pop()
+# Uzbek Latin is typed with several apostrophe look-alikes (oʻ, o‘, o', o`).
+_APOSTROPHES = str.maketrans({"ʻ": "'", "ʼ": "'", "‘": "'", "’": "'", "`": "'", "´": "'"})
 
-    def is_empty(self) -> bool:
-        return not self._items
 
+def normalize_name(text: str) -> str:
+    """Casefolded, NFKC-normalised name with unified apostrophes and spaces."""
+    text = unicodedata.normalize("NFKC", text).translate(_APOSTROPHES).casefold()
+    return " ".join(text.replace("ё", "е").split())
 
-class QueueNode:
-    def __init__(self, value: Reminder) -> None:
-        self.value = value
-        self.next: Optional[QueueNode] = None
 
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 
-class Queue:
-    def __init__(self) -> None:
-        self.head: Optional[QueueNode] = None
-        self.tail: Optional[QueueNode] = None
 
-    def enqueue(self, value: Reminder) -> None:
-        node = QueueNode(value)
-        if self.tail is None:
-            self.head = node
-            self.tail = node
+class NameSearchIndex:
+    """Trigram and word-prefix index over normalised subscription names.
+
+    Postings use names padded with a space on each side, so every trigram of
+    a substring query is also a trigram of any name containing it, and word
+    boundaries count towards fuzzy similarity.  Word prefixes of up to three
+    characters get their own postings for prefix search.
+    """
+
+    def __init__(self) -> None:
+        self._names: Dict[str, str] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def _word_prefixes(name: str) -> Set[str]:
+        return {word[:n] for word in name.split() for n in range(1, min(3, len(word)) + 1)}
+
+    def add(self, sub_id: str, name: str) -> None:
+        normalized = normalize_name(name)
+        grams = _trigrams(f" {normalized} ")
+        self._names[sub_id] = normalized
+        self._grams[sub_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(sub_id)
+        for prefix in self._word_prefixes(normalized):
+            self._prefixes.setdefault(prefix, set()).add(sub_id)
+
+    def remove(self, sub_id: str) -> None:
+        normalized = self._names.pop(sub_id, None)
+        if normalized is None:
             return
-        self.tail.next = node
-        self.tail = node
+        for gram in self._grams.pop(sub_id):
+            ids = self._postings[gram]
+            ids.discard(sub_id)
+            if not ids:
+                del self._postings[gram]
+        for prefix in self._word_prefixes(normalized):
+            ids = self._prefixes[prefix]
+            ids.discard(sub_id)
+            if not ids:
+                del self._prefixes[prefix]
+
+    def substring(self, query: str) -> Set[str]:
+        text = normalize_name(query)
+        if len(text) < 3:
+            return {sub_id for sub_id, name in self._names.items() if text in name}
+
+        postings = sorted((self._postings.get(gram, set()) for gram in _trigrams(text)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {sub_id for sub_id in candidates if text in self._names[sub_id]}
+
+    def prefix(self, query: str) -> Set[str]:
+        text = normalize_name(query)
+        if not text:
+            return set(self._names)
+        if len(text) <= 3:
+            return set(self._prefixes.get(text, ()))
+        padded = " " + text
+        return {
+            sub_id for sub_id in self.substring(text)
+            if self._names[sub_id].startswith(text) or padded in self._names[sub_id]
+        }
 
-    def dequeue(self) -> Optional[Reminder]:
-        if self.head is None:
+    def fuzzy(self, query: str, limit: int = 10) -> List[Tuple[float, str]]:
+        """Best ``(score, id)`` matches by trigram similarity, highest first.
+
+        The score is the Jaccard similarity of padded trigram sets, plus one
+        for names that contain the query outright.
+        """
+        text = normalize_name(query)
+        grams = _trigrams(f" {text} ")
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for sub_id in self._postings.get(gram, ()):
+                shared[sub_id] = shared.get(sub_id, 0) + 1
+
+        def score(item: Tuple[str, int]) -> float:
+            sub_id, common = item
+            similarity = common / (len(grams) + len(self._grams[sub_id]) - common)
+            return similarity + (1.0 if text in self._names[sub_id] else 0.0)
+
+        return [(score(item), item[0]) for item in heapq.nlargest(limit, shared.items(), key=score)]
+
+
+# ("deleted" | "added", subscription, id of the previous subscription, list sequence),
+# ("edited", subscription id, fields before, fields after) or ("batch", [entries])
+UndoEntry = Tuple[Any, ...]
+
+
+def _entry_size(entry: UndoEntry) -> int:
+    size = sys.getsizeof(entry)
+    for item in entry[1:]:
+        if isinstance(item, list):
+            size += sys.getsizeof(item) + sum(map(_entry_size, item))
+        elif isinstance(item, Subscription):
+            size += sys.getsizeof(item) + sys.getsizeof(item.id) + sys.getsizeof(item.name)
+        elif isinstance(item, dict):
+            size += sys.getsizeof(item)
+    return size
+
+
+class UndoLog:
+    """Bounded undo/redo history.
+
+    Deleted subscriptions are kept as-is (they are immutable, so nothing is
+    copied) together with their position; edits keep only the changed
+    fields.  The oldest entries are dropped once there are more than
+    ``max_depth`` of them or they take roughly more than ``max_bytes``.
+    """
+
+    def __init__(self, max_depth: int = 100, max_bytes: Optional[int] = None) -> None:
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self._undo: Deque[Tuple[UndoEntry, int]] = deque()
+        self._redo: List[UndoEntry] = []
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def record(self, entry: UndoEntry) -> None:
+        """Add a new action; this invalidates anything that could be redone."""
+        self._redo.clear()
+        self.push_undo(entry)
+
+    def push_undo(self, entry: UndoEntry) -> None:
+        size = _entry_size(entry)
+        self._undo.append((entry, size))
+        self._bytes += size
+        while self._undo and (
+            len(self._undo) > self.max_depth
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._bytes -= self._undo.popleft()[1]
+
+    def pop_undo(self) -> Optional[UndoEntry]:
+        if not self._undo:
             return None
+        entry, size = self._undo.pop()
+        self._bytes -= size
+        return entry
 
-        value = self.head.value
-        self.head = self.head.next
-        if self.head is None:
-            self.tail = None
-        return value
+    def push_redo(self, entry: UndoEntry) -> None:
+        self._redo.append(entry)
 
-    def peek(self) -> Optional[Reminder]:
-        if self.head is None:
-            return None
-        return self.head.value
+    def pop_redo(self) -> Optional[UndoEntry]:
+        return self._redo.pop() if self._redo else None
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+
+
+class ReminderHeap:
+    """Min-heap holding the next reminder of each subscription.
+
+    Entries are ``(remind_at, version, sub_id, renewal_date)``.  Rescheduling
+    or cancelling a subscription just gives it a new version (or none), and
+    entries whose version is no longer current are skipped when they reach
+    the top; the heap is compacted once stale entries outnumber live ones.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[datetime, int, str, datetime]] = []
+        self._versions: Dict[str, int] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._versions)
 
     def is_empty(self) -> bool:
-        return self.head is None
+        return self.peek() is None
+
+    def schedule(self, sub_id: str, renewal_date: datetime, remind_at: datetime) -> None:
+        version = next(self._counter)
+        self._versions[sub_id] = version
+        heapq.heappush(self._heap, (remind_at, version, sub_id, renewal_date))
+        self._maybe_compact()
+
+    def cancel(self, sub_id: str) -> None:
+        if self._versions.pop(sub_id, None) is not None:
+            self._maybe_compact()
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._versions.clear()
+
+    def peek(self) -> Optional[Tuple[datetime, int, str, datetime]]:
+        heap = self._heap
+        while heap and self._versions.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def pop(self) -> Optional[Tuple[datetime, int, str, datetime]]:
+        if self.peek() is None:
+            return None
+        entry = heapq.heappop(self._heap)
+        del self._versions[entry[2]]
+        return entry
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 2 * len(self._versions) + 64:
+            self._heap = [entry for entry in self._heap if self._versions.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+
+def _reminder_fields(sub: Subscription) -> tuple:
+    return (sub.renewal_date, sub.reminder_days_before, sub.billing_cycle,
+            sub.billing_cycle_value, sub.cancelled)
+
+
+def next_renewal(sub: Subscription, renewal_date: datetime) -> datetime:
+    """The renewal of ``sub`` after ``renewal_date``, kept on its original day of month."""
+    return nth_renewal(renewal_date, sub.billing_cycle, sub.billing_cycle_value, 1, sub.renewal_date.day)
+
+
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def _month_number(moment: datetime) -> int:
+    return moment.year * 12 + moment.month - 1
+
+
+def _month_start(month_number: int) -> datetime:
+    return datetime(month_number // 12, month_number % 12 + 1, 1)
+
+
+def _projection_bounds(start: datetime, months: int) -> Tuple[int, List[datetime]]:
+    first = _month_number(start)
+    return first, [_month_start(first + i) for i in range(months + 1)]
+
+
+class SpendingColumns:
+    """Struct-of-arrays copy of the fields the spending analytics read.
+
+    Rows are addressed through ``_rows`` (id -> row) and removal moves the
+    last row into the gap, so the arrays stay dense and every update is O(1)
+    amortised.  Categories and currencies are stored as integer codes.
+    Requires NumPy.
+    """
+
+    _COLUMNS = (
+        ("price", "float64"),
+        ("factor", "float64"),
+        ("step_months", "int32"),
+        ("step_days", "int32"),
+        ("category", "int32"),
+        ("currency", "int32"),
+        ("active", "bool"),
+        ("renewal_day", "int64"),
+        ("renewal_month", "int64"),
+    )
+
+    def __init__(self, capacity: int = 16) -> None:
+        if np is None:
+            raise RuntimeError("SpendingColumns requires numpy")
+        self._rows: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._codes: Dict[str, Dict[str, int]] = {"category": {}, "currency": {}}
+        self._labels: Dict[str, List[str]] = {"category": [], "currency": []}
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, np.zeros(max(1, capacity), dtype=dtype))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self._labels[column].append(value)
+        return code
+
+    def _grow(self) -> None:
+        for name, _ in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def add(self, sub: Subscription) -> None:
+        row = len(self._ids)
+        if row == len(self.price):
+            self._grow()
+        self._rows[sub.id] = row
+        self._ids.append(sub.id)
+        self._write(row, sub)
+
+    def update(self, old_id: str, sub: Subscription) -> None:
+        row = self._rows.pop(old_id)
+        self._rows[sub.id] = row
+        self._ids[row] = sub.id
+        self._write(row, sub)
+
+    def remove(self, sub_id: str) -> None:
+        row = self._rows.pop(sub_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        last_id = self._ids.pop()
+        if row != last:
+            for name, _ in self._COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self._ids[row] = last_id
+            self._rows[last_id] = row
+
+    def _write(self, row: int, sub: Subscription) -> None:
+        self.price[row] = sub.price
+        self.factor[row] = monthly_factor(sub.billing_cycle, sub.billing_cycle_value)
+        self.step_months[row], self.step_days[row] = cycle_step(sub.billing_cycle, sub.billing_cycle_value)
+        self.category[row] = self._code("category", sub.category)
+        self.currency[row] = self._code("currency", sub.currency)
+        self.active[row] = not sub.cancelled
+        self.renewal_day[row] = sub.renewal_date.toordinal() - _EPOCH_ORDINAL
+        self.renewal_month[row] = _month_number(sub.renewal_date)
+
+    def _view(self, name: str):
+        return getattr(self, name)[: len(self._ids)]
+
+    def monthly_amounts(self):
+        return self._view("price") * self._view("factor")
+
+    def total_monthly_cost(self) -> float:
+        return float(self.monthly_amounts()[self._view("active")].sum())
+
+    def breakdown(self, by: str) -> Dict[str, float]:
+        active = self._view("active")
+        codes = self._view(by)[active]
+        labels = self._labels[by]
+        sums = np.bincount(codes, weights=self.monthly_amounts()[active], minlength=len(labels))
+        counts = np.bincount(codes, minlength=len(labels))
+        return {labels[code]: float(sums[code]) for code in np.flatnonzero(counts)}
+
+    def cash_flow(self, start: datetime, months: int) -> List[float]:
+        first, bounds = _projection_bounds(start, months)
+        active = self._view("active")
+        price = self._view("price")[active]
+        step_days = self._view("step_days")[active]
+        by_days = step_days > 0
+        step_days = np.maximum(step_days, 1)
+        step_months = np.maximum(self._view("step_months")[active], 1)
+        renewal_day = self._view("renewal_day")[active]
+        # Month of the first charge, relative to the first projected month.
+        offset = self._view("renewal_month")[active] - first
+
+        totals: List[float] = []
+        for i in range(months):
+            lo = bounds[i].toordinal() - _EPOCH_ORDINAL
+            hi = bounds[i + 1].toordinal() - _EPOCH_ORDINAL
+            # Day-based charges fall on renewal_day + k * step_days for k >= 0,
+            # month-based ones every step_months months from offset.
+            start_day = np.maximum(renewal_day, lo)
+            in_days = np.maximum(
+                0,
+                -((renewal_day - hi) // step_days) + ((renewal_day - start_day) // step_days),
+            )
+            in_months = (offset <= i) & ((i - offset) % step_months == 0)
+            charges = np.where(by_days, in_days, in_months)
+            totals.append(float(price @ charges))
+        return totals
 
 
 class SubscriptionManager:
     """Simple in-memory manager for subscription operations and reminders."""
 
-    def __init__(self) -> None:
+    def __init__(self, undo_depth: int = 100, undo_bytes: Optional[int] = None) -> None:
         self.subscriptions = SubscriptionLinkedList()
-        self.undo_stack = Stack()
-        self.reminder_queue = Queue()
+        self.undo_log = UndoLog(undo_depth, undo_bytes)
+        self.reminder_queue = ReminderHeap()
+        # Reminders earlier than this are never armed; build_reminder_queue
+        # moves it, everything else keeps the heap current incrementally.
+        self._reminder_floor = datetime.now()
+        self._seq = itertools.count()
+        self._seqs: Dict[str, int] = {}
+        self.sorted_indexes: Dict[str, SortedIndex] = {
+            "renewal_date": SortedIndex(lambda sub: sub.renewal_date),
+            "price": SortedIndex(lambda sub: sub.price),
+            "category": SortedIndex(lambda sub: (sub.category, sub.name)),
+        }
+        self.name_index = NameSearchIndex()
+        self.columns = SpendingColumns() if np is not None else None
+        # Set while a batch is open: ids touched -> what the indexes held before.
+        self._pending: Optional[Dict[str, Optional[Subscription]]] = None
+        self._batch_log: Optional[List[UndoEntry]] = None
+
+    # ── Index maintenance ────────────────────────────────────────────────────
+    # The list and ``_seqs`` always change right away; the indexes, reminder
+    # heap and columns follow through ``_changed``, which a batch defers.
+    def _index_item(self, sub: Subscription) -> None:
+        self.name_index.add(sub.id, sub.name)
+        self._arm_reminder(sub)
+        if self.columns is not None:
+            self.columns.add(sub)
+
+    def _unindex_item(self, sub: Subscription) -> None:
+        self.name_index.remove(sub.id)
+        self.reminder_queue.cancel(sub.id)
+        if self.columns is not None:
+            self.columns.remove(sub.id)
+
+    def _index(self, sub: Subscription) -> None:
+        seq = self._seqs[sub.id]
+        for index in self.sorted_indexes.values():
+            index.add(sub, seq)
+        self._index_item(sub)
+
+    def _unindex(self, sub: Subscription) -> None:
+        for index in self.sorted_indexes.values():
+            index.remove(sub.id)
+        self._unindex_item(sub)
+
+    def _reindex(self, old: Subscription, new: Subscription) -> None:
+        seq = self._seqs[new.id]
+        for index in self.sorted_indexes.values():
+            if old.id != new.id or index.key(old) != index.key(new):
+                index.remove(old.id)
+                index.add(new, seq)
+        if old.id != new.id or old.name != new.name:
+            self.name_index.remove(old.id)
+            self.name_index.add(new.id, new.name)
+        if old.id != new.id:
+            self.reminder_queue.cancel(old.id)
+        if old.id != new.id or _reminder_fields(old) != _reminder_fields(new):
+            self._arm_reminder(new)
+        if self.columns is not None:
+            self.columns.update(old.id, new)
+
+    def _changed(self, old: Optional[Subscription], new: Optional[Subscription]) -> None:
+        pending = self._pending
+        if pending is None:
+            if old is None:
+                self._index(new)
+            elif new is None:
+                self._unindex(old)
+            else:
+                self._reindex(old, new)
+            return
+        # Remember what the indexes held for each id when the batch started.
+        if old is not None and old.id not in pending:
+            pending[old.id] = old
+        if new is not None and new.id not in pending:
+            pending[new.id] = None
+
+    def _flush(self, pending: Dict[str, Optional[Subscription]]) -> None:
+        """Bring every index up to date with the ids a batch touched, in one pass."""
+        find = self.subscriptions.find_by_id
+        changes = {name: ([], []) for name in self.sorted_indexes}
+        for sub_id, old in pending.items():
+            new = find(sub_id)
+            if new is old:
+                continue
+            seq = self._seqs.get(sub_id)
+            for name, index in self.sorted_indexes.items():
+                if new is None or not index.holds(new, seq):
+                    removed, added = changes[name]
+                    if old is not None:
+                        removed.append(sub_id)
+                    if new is not None:
+                        added.append((new, seq))
+            if old is None:
+                self._index_item(new)
+            elif new is None:
+                self._unindex_item(old)
+            else:
+                if old.name != new.name:
+                    self.name_index.remove(sub_id)
+                    self.name_index.add(sub_id, new.name)
+                if _reminder_fields(old) != _reminder_fields(new):
+                    self._arm_reminder(new)
+                if self.columns is not None:
+                    self.columns.update(sub_id, new)
+        for name, (removed, added) in changes.items():
+            self.sorted_indexes[name].replace_many(removed, added)
+
+    @contextmanager
+    def _deferred(self) -> Iterator[None]:
+        if self._pending is not None:
+            yield
+            return
+        self._pending = {}
+        try:
+            yield
+        finally:
+            pending, self._pending = self._pending, None
+            self._flush(pending)
+
+    def _arm_reminder(self, sub: Subscription, renewal: Optional[datetime] = None) -> None:
+        """Schedule the first reminder of ``sub`` at or after the reminder floor."""
+        if sub.cancelled:
+            self.reminder_queue.cancel(sub.id)
+            return
+        renewal = renewal or sub.renewal_date
+        lead = timedelta(days=sub.reminder_days_before)
+        if renewal - lead < self._reminder_floor:
+            renewal = advance(renewal, sub.billing_cycle, sub.billing_cycle_value,
+                              self._reminder_floor + lead, sub.renewal_date.day)
+        self.reminder_queue.schedule(sub.id, renewal, renewal - lead)
+
+    def _update(self, sub_id: str, updater: Callable[[Subscription], Subscription]) -> bool:
+        old = self.subscriptions.find_by_id(sub_id)
+        if old is None:
+            return False
+        new = updater(old)
+        self.subscriptions.update(sub_id, lambda _: new)
+        if new.id != sub_id:
+            self._seqs[new.id] = self._seqs.pop(sub_id)
+        self._changed(old, new)
+        return True
 
-    def add_subscription(self, subscription: Subscription) -> None:
+    def _insert(self, subscription: Subscription) -> None:
         self.subscriptions.append(subscription)
+        self._seqs[subscription.id] = next(self._seq)
+        self._changed(None, subscription)
 
-    def edit_subscription(self, sub_id: str, **updates) -> bool:
-        def updater(sub: Subscription) -> Subscription:
-            return replace(sub, **updates)
+    def _remove(self, sub_id: str) -> Optional[Subscription]:
+        removed = self.subscriptions.remove_by_id(sub_id)
+        if removed is not None:
+            del self._seqs[sub_id]
+            self._changed(removed, None)
+        return removed
+
+    def _record(self, entry: UndoEntry, batch_only: bool = False) -> None:
+        """Log an undoable action; inside a batch, every change is logged."""
+        if self._batch_log is not None:
+            self._batch_log.append(entry)
+        elif not batch_only:
+            self.undo_log.record(entry)
+
+    # ── Operations ───────────────────────────────────────────────────────────
+    def add_subscription(self, subscription: Subscription) -> None:
+        self._insert(subscription)
+        self._record(("added", subscription, None, None), batch_only=True)
 
-        return self.subscriptions.update(sub_id, updater)
+    def edit_subscription(self, sub_id: str, **updates) -> bool:
+        old = self.subscriptions.find_by_id(sub_id)
+        if old is None:
+            return False
+        before = {field: getattr(old, field) for field in updates}
+        self._update(sub_id, lambda sub: replace(sub, **updates))
+        self._record(("edited", sub_id, before, updates), batch_only=True)
+        return True
 
     def delete_subscription(self, sub_id: str) -> bool:
-        removed = self.subscriptions.remove_by_id(sub_id)
-        if removed is None:
+        entry = self._delete(sub_id)
+        if entry is None:
             return False
-        self.undo_stack.push(("deleted", removed))
+        self._record(entry)
         return True
 
     def cancel_subscription(self, sub_id: str) -> bool:
@@ -174,111 +808,263 @@ class SubscriptionManager:
         if original is None or original.cancelled:
             return False
 
-        self.undo_stack.push(("cancelled", replace(original)))
-        return self.subscriptions.update(sub_id, lambda sub: replace(sub, cancelled=True))
+        self._record(("edited", sub_id, {"cancelled": False}, {"cancelled": True}))
+        return self._update(sub_id, lambda sub: replace(sub, cancelled=True))
 
-    def undo_last(self) -> bool:
-        action = self.undo_stack.pop()
-        if action is None:
+    @contextmanager
+    def batch(self) -> Iterator["SubscriptionManager"]:
+        """Group changes into one undo step and one index update.
+
+        Indexes, searches, sorting and the reminder queue are brought up to
+        date when the block ends, so query them after it rather than inside.
+        If the block raises, every change made in it is rolled back.
+        """
+        if self._batch_log is not None:
+            yield self
+            return
+        log: List[UndoEntry] = []
+        self._batch_log = log
+        try:
+            with self._deferred():
+                try:
+                    yield self
+                except BaseException:
+                    self._batch_log = None
+                    for entry in reversed(log):
+                        self._apply(entry, reverse=True)
+                    raise
+        finally:
+            self._batch_log = None
+        if log:
+            self.undo_log.record(("batch", log))
+
+    def add_many(self, subscriptions: Iterable[Subscription]) -> int:
+        """Add all ``subscriptions`` as one batch; returns how many were added."""
+        added = 0
+        with self.batch():
+            for subscription in subscriptions:
+                self.add_subscription(subscription)
+                added += 1
+        return added
+
+    def edit_many(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """Apply ``{sub_id: {field: value}}`` as one batch; returns how many were edited."""
+        with self.batch():
+            return sum(self.edit_subscription(sub_id, **fields) for sub_id, fields in updates.items())
+
+    def delete_many(self, sub_ids: Iterable[str]) -> int:
+        """Delete ``sub_ids`` as one batch; returns how many existed."""
+        with self.batch():
+            return sum(self.delete_subscription(sub_id) for sub_id in sub_ids)
+
+    def _delete(self, sub_id: str) -> Optional[UndoEntry]:
+        if sub_id not in self.subscriptions:
+            return None
+        prev_id, _ = self.subscriptions.neighbours(sub_id)
+        seq = self._seqs[sub_id]
+        return ("deleted", self._remove(sub_id), prev_id, seq)
+
+    def _restore(self, sub: Subscription, prev_id: Optional[str], seq: Optional[int]) -> bool:
+        """Put a deleted subscription back where it was, or at the end if that spot is gone."""
+        if sub.id in self.subscriptions:
             return False
+        if seq is not None and (prev_id is None or prev_id in self.subscriptions):
+            _, next_id = self.subscriptions.neighbours(prev_id)
+            # The old sequence number keeps list order and index tie-breaks
+            # consistent only if the neighbours still surround it.
+            if (prev_id is None or self._seqs[prev_id] < seq) and (
+                next_id is None or seq < self._seqs[next_id]
+            ):
+                self.subscriptions.insert_after(prev_id, sub)
+                self._seqs[sub.id] = seq
+                self._changed(None, sub)
+                return True
+        self._insert(sub)
+        return True
 
-        action_type, subscription = action
-        if action_type == "deleted":
-            self.subscriptions.append(subscription)
-            return True
+    def _apply(self, entry: UndoEntry, reverse: bool) -> Optional[UndoEntry]:
+        """Undo (``reverse``) or redo ``entry``; returns the entry for the opposite log."""
+        kind = entry[0]
+        if kind == "batch":
+            with self._deferred():
+                items = reversed(entry[1]) if reverse else entry[1]
+                done = [result for result in (self._apply(item, reverse) for item in items) if result]
+            if reverse:
+                done.reverse()
+            return ("batch", done) if done else None
+
+        if kind in ("deleted", "added"):
+            _, sub, prev_id, seq = entry
+            if (kind == "deleted") == reverse:
+                return entry if self._restore(sub, prev_id, seq) else None
+            deleted = self._delete(sub.id)
+            return None if deleted is None else (kind,) + deleted[1:]
+
+        _, sub_id, before, after = entry
+        fields, current = (before, after) if reverse else (after, before)
+        if self._update(current.get("id", sub_id), lambda sub: replace(sub, **fields)):
+            return entry
+        return None
 
-        if action_type == "cancelled":
-            return self.subscriptions.update(
-                subscription.id,
-                lambda sub: replace(sub, cancelled=subscription.cancelled),
-            )
+    def undo(self, steps: int = 1) -> int:
+        """Undo up to ``steps`` actions, newest first; returns how many were undone."""
+        undone = 0
+        for _ in range(steps):
+            entry = self.undo_log.pop_undo()
+            if entry is None:
+                break
+            redo = self._apply(entry, reverse=True)
+            if redo is not None:
+                self.undo_log.push_redo(redo)
+                undone += 1
+        return undone
+
+    def redo(self, steps: int = 1) -> int:
+        """Re-apply up to ``steps`` undone actions; returns how many were redone."""
+        redone = 0
+        for _ in range(steps):
+            entry = self.undo_log.pop_redo()
+            if entry is None:
+                break
+            undo = self._apply(entry, reverse=False)
+            if undo is not None:
+                self.undo_log.push_undo(undo)
+                redone += 1
+        return redone
 
-        return False
+    def undo_last(self) -> bool:
+        return self.undo() == 1
 
     def list_subscriptions(self) -> List[Subscription]:
         return self.subscriptions.to_list()
 
+    def _in_list_order(self, ids: Iterable[str]) -> List[Subscription]:
+        find = self.subscriptions.find_by_id
+        return [find(sub_id) for sub_id in sorted(ids, key=self._seqs.__getitem__)]
+
     def search_by_name(self, query: str) -> List[Subscription]:
-        search_text = query.lower().strip()
-        return [
-            sub
-            for sub in self.subscriptions.to_list()
-            if search_text in sub.name.lower()
-        ]
+        """Subscriptions whose name contains ``query`` (case and accent insensitive)."""
+        return self._in_list_order(self.name_index.substring(query))
+
+    def search_by_prefix(self, query: str) -> List[Subscription]:
+        """Subscriptions with a word in their name starting with ``query``."""
+        return self._in_list_order(self.name_index.prefix(query))
+
+    def search_fuzzy(self, query: str, limit: int = 10) -> List[Subscription]:
+        """Closest names to ``query``, tolerant of typos, best match first."""
+        find = self.subscriptions.find_by_id
+        return [find(sub_id) for _, sub_id in self.name_index.fuzzy(query, limit)]
 
     def sort_subscriptions(self, by: str = "renewal_date") -> List[Subscription]:
-        items = self.subscriptions.to_list()
-        if by == "price":
-            return sorted(items, key=lambda sub: sub.price)
-        if by == "category":
-            return sorted(items, key=lambda sub: (sub.category, sub.name))
-        return sorted(items, key=lambda sub: sub.renewal_date)
+        index = self.sorted_indexes.get(by, self.sorted_indexes["renewal_date"])
+        find = self.subscriptions.find_by_id
+        return [find(sub_id) for sub_id in index.ids()]
 
     def expiring_soon(self, within_days: int = 7) -> List[Subscription]:
+        """Active subscriptions renewing in the next ``within_days``, soonest first."""
         now = datetime.now()
         end = now + timedelta(days=within_days)
+        find = self.subscriptions.find_by_id
         return [
             sub
-            for sub in self.subscriptions.to_list()
-            if (not sub.cancelled) and now <= sub.renewal_date <= end
+            for sub in map(find, self.sorted_indexes["renewal_date"].range_ids(now, end))
+            if not sub.cancelled
         ]
 
     def set_reminder_before_renewal(self, sub_id: str, days_before: int) -> bool:
         if days_before < 0:
             return False
-        return self.subscriptions.update(
+        return self._update(
             sub_id,
             lambda sub: replace(sub, reminder_days_before=days_before),
         )
 
     def total_monthly_cost(self) -> float:
-        factor = {
-            "weekly": 4,
-            "monthly": 1,
-            "yearly": 1 / 12,
-        }
+        if self.columns is not None:
+            return round(self.columns.total_monthly_cost(), 2)
 
         total = 0.0
-        for sub in self.subscriptions.to_list():
+        for sub in self.subscriptions:
             if sub.cancelled:
                 continue
-            total += sub.price * factor.get(sub.billing_cycle, 1)
+            total += sub.price * monthly_factor(sub.billing_cycle, sub.billing_cycle_value)
         return round(total, 2)
 
-    def build_reminder_queue(self, now: Optional[datetime] = None) -> None:
-        current_time = now or datetime.now()
-        self.reminder_queue = Queue()
+    def spending_breakdown(self, by: str = "category") -> Dict[str, float]:
+        """Monthly cost of active subscriptions per category or currency, largest first."""
+        if by not in ("category", "currency"):
+            raise ValueError(f"Cannot break spending down by {by!r}")
+        if self.columns is not None:
+            totals = self.columns.breakdown(by)
+        else:
+            totals = {}
+            for sub in self.subscriptions:
+                if sub.cancelled:
+                    continue
+                key = getattr(sub, by)
+                totals[key] = totals.get(key, 0.0) + sub.price * monthly_factor(
+                    sub.billing_cycle, sub.billing_cycle_value
+                )
+        return {
+            key: round(amount, 2)
+            for key, amount in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        }
+
+    def cash_flow_projection(self, months: int = 12, start: Optional[datetime] = None) -> List[float]:
+        """Amount charged in each calendar month, starting with the month of ``start``.
+
+        Every active subscription charges on its renewal date and then once per
+        billing cycle; unlike ``total_monthly_cost`` this counts actual charges,
+        so a yearly plan shows up in one month only.
+        """
+        start = start or datetime.now()
+        if self.columns is not None:
+            return [round(amount, 2) for amount in self.columns.cash_flow(start, months)]
 
-        reminders: List[Reminder] = []
-        for sub in self.subscriptions.to_list():
+        first, bounds = _projection_bounds(start, months)
+        totals = [0.0] * months
+        for sub in self.subscriptions:
             if sub.cancelled:
                 continue
+            charge = sub.renewal_date
+            while charge < bounds[-1]:
+                month = _month_number(charge) - first
+                if month >= 0:
+                    totals[month] += sub.price
+                charge = next_renewal(sub, charge)
+        return [round(amount, 2) for amount in totals]
 
-            remind_at = sub.renewal_date - timedelta(days=sub.reminder_days_before)
-            if remind_at >= current_time:
-                reminders.append(
-                    Reminder(
-                        subscription_id=sub.id,
-                        subscription_name=sub.name,
-                        renewal_date=sub.renewal_date,
-                        remind_at=remind_at,
-                    )
-                )
+    def build_reminder_queue(self, now: Optional[datetime] = None) -> None:
+        """Re-arm every reminder from ``now`` on.
 
-        for reminder in sorted(reminders, key=lambda item: item.remind_at):
-            self.reminder_queue.enqueue(reminder)
+        The queue is kept up to date on every change, so this is only needed
+        to move the starting point, e.g. when replaying from a fixed time.
+        """
+        self._reminder_floor = now or datetime.now()
+        self.reminder_queue.clear()
+        for sub in self.subscriptions:
+            self._arm_reminder(sub)
 
     def pop_due_reminders(self, now: Optional[datetime] = None) -> List[Reminder]:
+        """Pop every reminder due by ``now``; recurring ones re-arm for the next cycle."""
         current_time = now or datetime.now()
         due: List[Reminder] = []
 
         while True:
             head = self.reminder_queue.peek()
-            if head is None or head.remind_at > current_time:
+            if head is None or head[0] > current_time:
                 break
-            next_due = self.reminder_queue.dequeue()
-            if next_due is not None:
-                due.append(next_due)
+            remind_at, _, sub_id, renewal_date = self.reminder_queue.pop()
+            sub = self.subscriptions.find_by_id(sub_id)
+            due.append(
+                Reminder(
+                    subscription_id=sub_id,
+                    subscription_name=sub.name,
+                    renewal_date=renewal_date,
+                    remind_at=remind_at,
+                )
+            )
+            self._arm_reminder(sub, next_renewal(sub, renewal_date))
 
         return due
 
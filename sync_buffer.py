@@ -0,0 +1,316 @@
+"""Write-behind buffer for full-list syncs from the mini app.
+
+``/api/sync`` validates the posted list, records it here and answers at once.
+Only the newest list per user is kept: a snapshot that arrives while an
+older one is still pending simply replaces it.  A background flusher writes
+pending snapshots to the database, many users per transaction, as soon as
+``SYNC_FLUSH_BATCH`` users are waiting or ``SYNC_FLUSH_INTERVAL`` seconds
+after the first one arrived.
+
+Every accepted snapshot is appended to a small journal file, with a sequence
+number, before it is acknowledged; after each flush a marker listing the
+committed sequence numbers is appended too.  On start-up only snapshots
+without a marker are queued again, so a replay never overwrites rows that
+were changed some other way after the snapshot was written.  (If the process
+dies between a database commit and its marker, that one batch is written
+again.)  The journal is compacted to the uncommitted entries once it holds
+mostly committed ones, and removed when nothing is pending.
+
+Validation and all journal I/O run on a dedicated thread, in submission
+order, so the event loop only waits for them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, NamedTuple
+
+import db
+
+logger = logging.getLogger(__name__)
+
+SYNC_FLUSH_INTERVAL = float(os.getenv("SYNC_FLUSH_INTERVAL", "0.5"))   # seconds
+SYNC_FLUSH_BATCH = int(os.getenv("SYNC_FLUSH_BATCH", "200"))           # users per transaction
+SYNC_JOURNAL_PATH = os.getenv("SYNC_JOURNAL_PATH", "sync_journal.jsonl")
+# fsync each journal append; without it the journal survives a process crash
+# but not a power failure.
+SYNC_JOURNAL_FSYNC = os.getenv("SYNC_JOURNAL_FSYNC", "0") == "1"
+
+# on_commit(user_id, result) with the result dict of db.sync_subscriptions.
+CommitFn = Callable[[int, dict], Awaitable[None]]
+
+
+class _Snapshot(NamedTuple):
+    seq: int
+    batch: db.SubscriptionBatch
+    rejected: list[dict]
+
+
+class _Journal:
+    """Append-only file of accepted snapshots and commit markers.
+
+    Only used from the buffer's journal thread.  ``_live`` mirrors the
+    entries that are not committed yet, so compaction never has to read the
+    file back.
+    """
+
+    def __init__(self, path: str, slack: int) -> None:
+        self.path = path
+        self._slack = slack
+        self._file = None
+        self._lines = 0
+        self._live: dict[int, tuple[int, str]] = {}   # user_id -> (seq, line)
+
+    def _write(self, line: str) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(line)
+        self._file.flush()
+        if SYNC_JOURNAL_FSYNC:
+            os.fsync(self._file.fileno())
+        self._lines += 1
+
+    def accept(self, user_id: int, seq: int, subs: list) -> tuple[db.SubscriptionBatch, list[dict]]:
+        """Validate ``subs`` and journal them; nothing is written if validation raises."""
+        batch, rejected = db.validate_subscriptions(user_id, subs)
+        line = json.dumps({"seq": seq, "user_id": user_id, "subscriptions": subs}) + "\n"
+        self._write(line)
+        self._live[user_id] = (seq, line)
+        return batch, rejected
+
+    def commit(self, committed: list[tuple[int, int]]) -> None:
+        """Record ``(user_id, seq)`` pairs as written to the database."""
+        self._write(json.dumps({"committed": committed}) + "\n")
+        for user_id, seq in committed:
+            live = self._live.get(user_id)
+            if live is not None and live[0] <= seq:
+                del self._live[user_id]
+        if not self._live or self._lines > 2 * len(self._live) + self._slack:
+            self._compact()
+
+    def _compact(self) -> None:
+        self.close()
+        self._lines = len(self._live)
+        if not self._live:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for _, line in self._live.values():
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def replay(self) -> list[tuple[int, int, db.SubscriptionBatch, list[dict]]]:
+        """Validated ``(user_id, seq, batch, rejected)`` for every uncommitted entry."""
+        latest: dict[int, tuple[int, list, str]] = {}
+        done: dict[int, int] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash; it was never acknowledged.
+                        continue
+                    if "committed" in entry:
+                        for user_id, seq in entry["committed"]:
+                            done[user_id] = max(seq, done.get(user_id, -1))
+                    elif entry["seq"] > latest.get(entry["user_id"], (-1,))[0]:
+                        latest[entry["user_id"]] = (entry["seq"], entry["subscriptions"], line)
+        except FileNotFoundError:
+            pass
+
+        recovered = []
+        for user_id, (seq, subs, line) in latest.items():
+            if seq <= done.get(user_id, -1):
+                continue
+            batch, rejected = db.validate_subscriptions(user_id, subs)
+            self._live[user_id] = (seq, line)
+            recovered.append((user_id, seq, batch, rejected))
+        self._compact()
+        return recovered
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SyncBuffer:
+    """Coalesces full syncs per user and commits them in batches."""
+
+    def __init__(self, on_commit: CommitFn | None = None, *,
+                 journal_path: str = SYNC_JOURNAL_PATH,
+                 interval: float = SYNC_FLUSH_INTERVAL,
+                 batch_size: int = SYNC_FLUSH_BATCH) -> None:
+        self._on_commit = on_commit
+        self._interval = interval
+        self._batch_size = max(1, batch_size)
+        self._journal = _Journal(journal_path, slack=self._batch_size)
+        # One thread, so journal writes happen in the order they were submitted.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yodda-journal")
+        self._pending: dict[int, _Snapshot] = {}
+        self._next_seq = 0
+        self._first_pending = 0.0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._submitting = 0
+        self._submitted = asyncio.Event()
+        self.accepted = 0
+        self.coalesced = 0
+        self.committed = 0
+        self.flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def _in_journal_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    async def start(self) -> None:
+        """Re-queue uncommitted snapshots from the journal and start the flusher."""
+        if self._task is not None:
+            return
+        recovered = await self._in_journal_thread(self._journal.replay)
+        for user_id, seq, batch, rejected in recovered:
+            self._queue(user_id, _Snapshot(seq, batch, rejected))
+            self._next_seq = max(self._next_seq, seq + 1)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} pending sync(s) from {self._journal.path}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out everything still pending.
+
+        Submits already in progress are waited for; later ones are refused.
+        """
+        self._stopping = True
+        while self._submitting:
+            self._submitted.clear()
+            await self._submitted.wait()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        await self._in_journal_thread(self._journal.close)
+        self._executor.shutdown(wait=True)
+
+    # ── Submitting ───────────────────────────────────────────────────────────
+    async def submit(self, user_id: int, subs: list) -> list[dict]:
+        """Validate and queue a full list for ``user_id``; returns the rejected rows.
+
+        The snapshot is in the journal when this returns.  Raises
+        ``RuntimeError`` once ``stop()`` has been called.
+        """
+        if self._stopping:
+            raise RuntimeError("sync buffer is stopping")
+        seq = self._next_seq
+        self._next_seq += 1
+        self._submitting += 1
+        try:
+            batch, rejected = await self._in_journal_thread(self._journal.accept, user_id, seq, subs)
+            self._queue(user_id, _Snapshot(seq, batch, rejected))
+        finally:
+            self._submitting -= 1
+            self._submitted.set()
+        self.accepted += 1
+        return rejected
+
+    def _queue(self, user_id: int, snapshot: _Snapshot) -> None:
+        current = self._pending.get(user_id)
+        if current is not None:
+            if current.seq > snapshot.seq:
+                return
+            self.coalesced += 1
+        elif not self._pending:
+            self._first_pending = time.monotonic()
+        self._pending[user_id] = snapshot
+        if len(self._pending) >= self._batch_size or len(self._pending) == 1:
+            self._wakeup.set()
+
+    # ── Flushing ─────────────────────────────────────────────────────────────
+    async def flush(self, user_id: int | None = None) -> None:
+        """Commit pending snapshots now: all of them, or just ``user_id``'s.
+
+        Callers that write a user's rows some other way flush that user first
+        so an older queued snapshot cannot overwrite their change later.
+        """
+        async with self._flush_lock:
+            if user_id is None:
+                while self._pending:
+                    await self._commit(list(self._pending.items())[: self._batch_size])
+            elif user_id in self._pending:
+                await self._commit([(user_id, self._pending[user_id])])
+
+    async def _commit(self, items: list[tuple[int, _Snapshot]]) -> None:
+        results = await db.sync_many([(snapshot.batch, snapshot.rejected) for _, snapshot in items])
+        for user_id, snapshot in items:
+            # A newer snapshot may have replaced this one while it was written.
+            if self._pending.get(user_id) is snapshot:
+                del self._pending[user_id]
+        self.flushes += 1
+        self.committed += len(items)
+        await self._in_journal_thread(
+            self._journal.commit, [(user_id, snapshot.seq) for user_id, snapshot in items]
+        )
+        if self._pending:
+            self._first_pending = time.monotonic()
+        if self._on_commit is not None:
+            for (user_id, _), result in zip(items, results):
+                try:
+                    await self._on_commit(user_id, result)
+                except Exception as e:
+                    logger.error(f"Sync commit hook failed for user {user_id}: {e}")
+
+    async def _run(self) -> None:
+        backoff = self._interval
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                if len(self._pending) < self._batch_size:
+                    delay = self._first_pending + self._interval - time.monotonic()
+                    if delay > 0:
+                        # asyncio.timeout rather than wait_for: on 3.11 wait_for
+                        # can swallow a cancel that races with the wakeup,
+                        # and stop() would then wait forever.
+                        try:
+                            async with asyncio.timeout(delay):
+                                await self._wakeup.wait()
+                            self._wakeup.clear()
+                            continue
+                        except TimeoutError:
+                            pass
+                try:
+                    async with self._flush_lock:
+                        await self._commit(list(self._pending.items())[: self._batch_size])
+                    backoff = self._interval
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Whatever was not committed is still pending and journaled;
+                    # try again later.
+                    logger.error(f"Sync flush failed ({len(self._pending)} pending): {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(30.0, backoff * 2)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "committed": self.committed,
+            "flushes": self.flushes,
+        }
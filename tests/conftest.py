@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def db_pool(tmp_path, monkeypatch):
+    """A connection pool on an empty temporary database, installed as ``db.pool``."""
+    pool = db.ConnectionPool(str(tmp_path / "yodda.db"), size=2)
+    monkeypatch.setattr(db, "pool", pool)
+    yield pool
+    pool.close()
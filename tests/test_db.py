@@ -0,0 +1,151 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import db
+
+# The schema as bot.py created it before db.py and its migrations existed.
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    user_id     INTEGER PRIMARY KEY,
+    language    TEXT,
+    phone       TEXT,
+    first_name  TEXT,
+    last_name   TEXT,
+    username    TEXT,
+    photo_url   TEXT,
+    group_msg_id INTEGER
+);
+CREATE TABLE subscriptions (
+    id                  TEXT    NOT NULL,
+    user_id             INTEGER NOT NULL,
+    name                TEXT    NOT NULL,
+    category            TEXT    NOT NULL,
+    amount              REAL    NOT NULL,
+    currency            TEXT    NOT NULL,
+    billing_cycle_type  TEXT    NOT NULL,
+    billing_cycle_value INTEGER NOT NULL DEFAULT 1,
+    next_billing_date   TEXT    NOT NULL,
+    reminder_days       INTEGER NOT NULL DEFAULT 3,
+    notes               TEXT,
+    is_free_trial       INTEGER NOT NULL DEFAULT 0,
+    created_at          TEXT    NOT NULL,
+    PRIMARY KEY (id, user_id),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+INSERT INTO users (user_id, language) VALUES (1, 'en');
+INSERT INTO subscriptions
+    (id, user_id, name, category, amount, currency, billing_cycle_type,
+     next_billing_date, created_at)
+VALUES ('netflix', 1, 'Netflix', 'video', 9.99, 'USD', 'monthly',
+        '2026-03-15T00:00:00', '2026-01-01T00:00:00');
+"""
+
+
+@pytest.fixture
+def baseline_db(db_pool):
+    conn = sqlite3.connect(db_pool.path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+    return db_pool.path
+
+
+def _plan(path: str, sql: str, params: tuple) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    finally:
+        conn.close()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migrations_upgrade_baseline_and_are_idempotent(baseline_db):
+    asyncio.run(db.init_db())
+    asyncio.run(db.init_db())
+
+    conn = sqlite3.connect(baseline_db)
+    try:
+        applied = [row[0] for row in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+        billing_day = conn.execute("SELECT billing_day FROM subscriptions").fetchone()[0]
+    finally:
+        conn.close()
+    assert applied == [version for version, _, _ in db.MIGRATIONS]
+    assert billing_day == db.to_epoch_day(db.date(2026, 3, 15))
+
+
+@pytest.mark.parametrize("sql, params, index", [
+    pytest.param(db._SELECT_DUE_CHUNK, (0, 0, "", 30000, 500), "idx_subscriptions_due", id="due-chunk"),
+    pytest.param(db._SELECT_USER_DUE, (1, 20000, 20007), "idx_subscriptions_user_due", id="user-due"),
+    pytest.param(db._SELECT_USER_SUBSCRIPTIONS, (1,), "idx_subscriptions_user_due", id="diff"),
+    pytest.param(db._SELECT_STALE, (20000,), "idx_subscriptions_due", id="stale"),
+])
+def test_hot_queries_use_indexes(baseline_db, sql, params, index):
+    asyncio.run(db.init_db())
+    asyncio.run(db.init_db())
+
+    plan = _plan(baseline_db, sql, params)
+    assert not any(line.startswith("SCAN") for line in plan.splitlines()), plan
+    assert any(line.startswith("SEARCH") and f"INDEX {index} " in line for line in plan.splitlines()), plan
+
+
+def test_billing_dates_advance_from_the_anchor_day(db_pool):
+    async def run():
+        await db.init_db()
+        await db.upsert_user(1, language="en")
+        await db.sync_subscriptions(1, [{
+            "id": "gym", "name": "Gym", "category": "health", "currency": "USD", "amount": 30,
+            "billing_cycle_type": "monthly", "next_billing_date": "2025-01-31",
+        }])
+        dates = []
+        for today in (db.date(2025, 2, 1), db.date(2025, 3, 1), db.date(2025, 4, 1)):
+            await db.pool.run(db._advance_billing_dates, db.to_epoch_day(today))
+            _, rows = await db.load_user_subscriptions(1)
+            dates.append(rows[0][7])
+        return dates
+
+    assert asyncio.run(run()) == ["2025-02-28", "2025-03-31", "2025-04-30"]
+
+
+def test_a_new_billing_date_from_the_app_moves_the_anchor(db_pool):
+    sub = {
+        "id": "gym", "name": "Gym", "category": "health", "currency": "USD", "amount": 30,
+        "billing_cycle_type": "monthly", "next_billing_date": "2025-01-31",
+    }
+
+    async def run():
+        await db.init_db()
+        await db.sync_subscriptions(1, [sub])
+        await db.pool.run(db._advance_billing_dates, db.to_epoch_day(db.date(2025, 2, 1)))
+        # The app echoes the clamped date back: the anchor stays on the 31st.
+        await db.sync_subscriptions(1, [{**sub, "next_billing_date": "2025-02-28", "amount": 35}])
+        await db.pool.run(db._advance_billing_dates, db.to_epoch_day(db.date(2025, 3, 1)))
+        _, rows = await db.load_user_subscriptions(1)
+        kept = rows[0][7]
+        # The user picks a different date in the app: that becomes the anchor.
+        await db.sync_subscriptions(1, [{**sub, "next_billing_date": "2025-04-15"}])
+        await db.pool.run(db._advance_billing_dates, db.to_epoch_day(db.date(2025, 4, 16)))
+        _, rows = await db.load_user_subscriptions(1)
+        return kept, rows[0][7]
+
+    assert asyncio.run(run()) == ("2025-03-31", "2025-05-15")
+
+
+def test_upsert_fills_the_user_cache(db_pool, monkeypatch):
+    monkeypatch.setattr(db, "user_cache", db.UserCache())
+    calls = []
+    run = db_pool.run
+
+    async def counting_run(fn, *args):
+        calls.append(fn.__name__)
+        return await run(fn, *args)
+
+    async def main():
+        await db.init_db()
+        monkeypatch.setattr(db_pool, "run", counting_run)
+        await db.upsert_user(7, first_name="Ada", username="ada")
+        return await db.get_user(7)
+
+    row = asyncio.run(main())
+    assert calls == ["_upsert_user"]
+    assert (row["user_id"], row["first_name"], row["username"], row["language"]) == (7, "Ada", "ada", None)
@@ -0,0 +1,126 @@
+import asyncio
+
+import db
+from db import DueSubscription
+from dispatcher import ReminderDispatcher
+
+
+class FloodWait(Exception):
+    """Stands in for aiogram's TelegramRetryAfter."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+class Blocked(Exception):
+    pass
+
+
+def due(user_id: int, sub_id: str = "s1") -> DueSubscription:
+    return DueSubscription(user_id, sub_id, "Netflix", 9.99, "USD", "2026-11-01", 20393, 3, 0, "en", None)
+
+
+def record_dead_letters(monkeypatch) -> list[tuple]:
+    dead: list[tuple] = []
+
+    async def add_dead_letter(*args) -> None:
+        dead.append(args)
+
+    monkeypatch.setattr(db, "add_dead_letter", add_dead_letter)
+    return dead
+
+
+def test_retry_after_pauses_and_resends(monkeypatch):
+    dead = record_dead_letters(monkeypatch)
+    calls: list[int] = []
+
+    async def send(sub, offset, today):
+        calls.append(sub.user_id)
+        if len(calls) == 1:
+            raise FloodWait(0.05)
+
+    async def run():
+        dispatcher = ReminderDispatcher(send, workers=2, rate=1000, per_chat_interval=0, max_attempts=2)
+        dispatcher.start()
+        await dispatcher.submit(due(1), 3, 0)
+        for _ in range(100):
+            if dispatcher.sent:
+                break
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert calls == [1, 1]
+    assert (dispatcher.sent, dispatcher.retried, dispatcher.failed) == (1, 1, 0)
+    assert dead == []
+
+
+def test_repeated_flood_control_is_dead_lettered(monkeypatch):
+    dead = record_dead_letters(monkeypatch)
+    calls: list[int] = []
+
+    async def send(sub, offset, today):
+        calls.append(sub.user_id)
+        raise FloodWait(0.01)
+
+    async def run():
+        dispatcher = ReminderDispatcher(send, workers=1, rate=1000, per_chat_interval=0, max_attempts=3)
+        dispatcher.start()
+        await dispatcher.submit(due(1), 3, 0)
+        for _ in range(200):
+            if dispatcher.failed:
+                break
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert calls == [1, 1, 1]
+    assert (dispatcher.sent, dispatcher.retried, dispatcher.failed) == (0, 2, 1)
+    assert [(d[0], d[4]) for d in dead] == [(1, 3)]
+
+
+def test_failures_are_dead_lettered(monkeypatch):
+    dead = record_dead_letters(monkeypatch)
+
+    async def send(sub, offset, today):
+        raise Blocked("bot was blocked") if sub.user_id == 1 else RuntimeError("network down")
+
+    async def run():
+        dispatcher = ReminderDispatcher(send, workers=2, rate=1000, per_chat_interval=0,
+                                        max_attempts=1, permanent_errors=(Blocked,))
+        dispatcher.start()
+        await dispatcher.submit(due(1), 3, 0)
+        await dispatcher.submit(due(2), 1, 0)
+        await dispatcher.join()
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert (dispatcher.sent, dispatcher.failed) == (0, 2)
+    assert sorted((d[0], d[3], d[4], d[5]) for d in dead) == [
+        (1, 3, 1, "bot was blocked"), (2, 1, 1, "network down"),
+    ]
+
+
+def test_stop_releases_unsent_claims(monkeypatch):
+    released: list[tuple] = []
+
+    async def release_reminders(keys):
+        released.extend(keys)
+
+    async def send(sub, offset, today):
+        raise AssertionError("nothing should be sent")
+
+    monkeypatch.setattr(db, "release_reminders", release_reminders)
+
+    async def run():
+        dispatcher = ReminderDispatcher(send)
+        await dispatcher.submit(due(1, "a"), 3, 0)
+        await dispatcher.submit(due(2, "b"), 0, 0)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert sorted(released) == [(1, "a", "2026-11-01", 3), (2, "b", "2026-11-01", 0)]
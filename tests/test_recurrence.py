@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+
+import recurrence
+from recurrence import add_months, advance, advance_many, cycle_step, monthly_factor, nth_renewal
+
+
+def epoch_day(d: date) -> int:
+    return d.toordinal() - date(1970, 1, 1).toordinal()
+
+
+def test_month_end_is_clamped():
+    assert add_months(date(2026, 1, 31), 1) == date(2026, 2, 28)
+    assert add_months(date(2028, 1, 31), 1) == date(2028, 2, 29)
+    assert add_months(date(2026, 3, 31), 1) == date(2026, 4, 30)
+    assert add_months(date(2026, 11, 30), 3) == date(2027, 2, 28)
+
+
+def test_renewals_keep_the_billing_day_after_a_short_month():
+    start = date(2026, 1, 31)
+    assert [nth_renewal(start, "monthly", 1, n) for n in range(4)] == [
+        date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30),
+    ]
+    assert nth_renewal(date(2028, 2, 29), "yearly", 1, 1) == date(2029, 2, 28)
+
+
+def test_advance_catches_up_in_one_step():
+    assert advance(date(2020, 1, 31), "monthly", 1, date(2026, 10, 18)) == date(2026, 10, 31)
+    assert advance(date(2026, 1, 31), "monthly", 1, date(2026, 3, 1)) == date(2026, 3, 31)
+    assert advance(date(2026, 10, 1), "weekly", 2, date(2026, 10, 16)) == date(2026, 10, 29)
+    # Not stale: unchanged.
+    assert advance(date(2026, 12, 1), "monthly", 1, date(2026, 10, 18)) == date(2026, 12, 1)
+
+
+def test_custom_cycle_is_monthly():
+    assert cycle_step("custom") == cycle_step("monthly")
+    assert monthly_factor("custom", 2) == monthly_factor("monthly", 2)
+
+
+def test_day_and_week_cycles_use_the_same_month_length():
+    assert monthly_factor("weekly") * 7 == pytest.approx(monthly_factor("daily"))
+    assert monthly_factor("weekly", 2) == pytest.approx(monthly_factor("daily", 14))
+
+
+@pytest.mark.parametrize("vectorised", [True, False])
+def test_advance_many_matches_advance(monkeypatch, vectorised):
+    if vectorised and recurrence.np is None:
+        pytest.skip("numpy is not installed")
+    if not vectorised:
+        monkeypatch.setattr(recurrence, "np", None)
+    today = date(2026, 3, 1)
+    starts = [date(2025, m, d) for m in (1, 3, 5, 8, 10, 12) for d in (1, 15, 28, 29, 30, 31)
+              if d <= [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][m - 1]]
+    cycles = [("monthly", 1), ("monthly", 3), ("quarterly", 1), ("yearly", 1), ("weekly", 1), ("daily", 10)]
+    rows = [(start, cycle) for start in starts for cycle in cycles]
+    rows.append((date(2026, 5, 31), ("monthly", 1)))
+    assert len(rows) >= 64
+
+    result = advance_many([epoch_day(start) for start, _ in rows],
+                          [cycle for _, (cycle, _) in rows],
+                          [value for _, (_, value) in rows],
+                          epoch_day(today))
+    assert result == [epoch_day(advance(start, cycle, value, today)) for start, (cycle, value) in rows]
+
+
+@pytest.mark.parametrize("vectorised", [True, False])
+def test_advance_many_returns_to_the_anchor_day(monkeypatch, vectorised):
+    if vectorised and recurrence.np is None:
+        pytest.skip("numpy is not installed")
+    if not vectorised:
+        monkeypatch.setattr(recurrence, "np", None)
+    n = 64
+    clamped = [epoch_day(date(2025, 2, 28))] * n
+    result = advance_many(clamped, ["monthly"] * n, [1] * n, epoch_day(date(2025, 3, 1)), [31] * n)
+    assert result == [epoch_day(date(2025, 3, 31))] * n
+    # Without an anchor the clamped day is all there is to go on.
+    result = advance_many(clamped, ["monthly"] * n, [1] * n, epoch_day(date(2025, 3, 1)))
+    assert result == [epoch_day(date(2025, 3, 28))] * n
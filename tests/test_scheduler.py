@@ -0,0 +1,23 @@
+import asyncio
+
+import db
+from scheduler import ReminderScheduler
+
+
+def test_cancel_is_not_lost_while_changes_arrive(db_pool):
+    async def send(sub, offset, today):
+        pass
+
+    async def run():
+        await db.init_db()
+        scheduler = ReminderScheduler(send)
+        for _ in range(20):
+            task = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.02)
+            # A reschedule and a shutdown landing in the same loop iteration.
+            scheduler._changed.set()
+            task.cancel()
+            await asyncio.wait_for(asyncio.gather(task, return_exceptions=True), 5)
+            assert task.cancelled()
+
+    asyncio.run(run())
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from subscription_manager import Subscription, SubscriptionManager
+
+
+def make(sub_id: str, name: str | None = None, price: float = 10.0, days: int = 5) -> Subscription:
+    return Subscription(
+        id=sub_id,
+        name=name or f"Service {sub_id}",
+        category="video",
+        price=price,
+        renewal_date=datetime(2026, 11, 1) + timedelta(days=days),
+    )
+
+
+def snapshot(manager: SubscriptionManager) -> list[tuple]:
+    return [(s.id, s.name, s.price, s.cancelled) for s in manager.list_subscriptions()]
+
+
+@pytest.fixture
+def manager() -> SubscriptionManager:
+    manager = SubscriptionManager()
+    for i in range(5):
+        manager.add_subscription(make(str(i), days=i))
+    manager.undo_log.clear()
+    return manager
+
+
+def test_undo_and_redo_single_changes(manager):
+    before = snapshot(manager)
+    manager.delete_subscription("2")
+    manager.cancel_subscription("3")
+    after = snapshot(manager)
+
+    assert manager.undo(2) == 2
+    assert snapshot(manager) == before
+    assert not manager.undo_log.can_undo()
+
+    assert manager.redo(2) == 2
+    assert snapshot(manager) == after
+
+
+def test_single_adds_and_edits_are_not_undoable(manager):
+    # As before batches existed, only deletes and cancels are undo steps.
+    manager.add_subscription(make("new"))
+    manager.edit_subscription("1", price=99.0)
+    assert not manager.undo_log.can_undo()
+
+
+def test_undo_restores_a_deleted_subscription_in_place(manager):
+    before = snapshot(manager)
+    manager.delete_subscription("2")
+    manager.undo()
+    assert snapshot(manager) == before
+    assert [s.id for s in manager.sort_subscriptions("renewal_date")] == ["0", "1", "2", "3", "4"]
+
+
+def test_new_change_clears_redo(manager):
+    manager.cancel_subscription("1")
+    manager.undo()
+    manager.delete_subscription("2")
+    assert manager.redo() == 0
+
+
+def test_batch_is_one_undo_step(manager):
+    before = snapshot(manager)
+    with manager.batch():
+        manager.add_subscription(make("new"))
+        manager.edit_subscription("0", name="Renamed")
+        manager.delete_subscription("4")
+    assert [s.name for s in manager.search_by_name("renamed")] == ["Renamed"]
+
+    assert manager.undo() == 1
+    assert snapshot(manager) == before
+    assert manager.search_by_name("renamed") == []
+
+
+def test_failed_batch_is_rolled_back(manager):
+    manager.cancel_subscription("1")
+    before = snapshot(manager)
+    depth = len(manager.undo_log)
+
+    with pytest.raises(RuntimeError):
+        with manager.batch():
+            manager.add_many([make("a"), make("b")])
+            manager.delete_many(["0", "2"])
+            manager.edit_subscription("3", price=0.5)
+            raise RuntimeError("import failed")
+
+    assert snapshot(manager) == before
+    assert len(manager.undo_log) == depth
+    assert [s.id for s in manager.sort_subscriptions("price")] == [
+        s.id for s in sorted(manager.list_subscriptions(), key=lambda s: s.price)
+    ]
+    # The change made before the batch is still the one undone next.
+    manager.undo()
+    assert not manager.subscriptions.find_by_id("1").cancelled
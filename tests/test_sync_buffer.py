@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import db
+from sync_buffer import SyncBuffer
+
+
+def sub(sub_id: str, name: str = "Netflix") -> dict:
+    return {
+        "id": sub_id, "name": name, "category": "video", "currency": "USD", "amount": 9.99,
+        "billing_cycle_type": "monthly", "next_billing_date": "2026-11-01",
+    }
+
+
+async def names(user_id: int) -> list[str]:
+    _, rows = await db.load_user_subscriptions(user_id)
+    return [row[1] for row in rows]
+
+
+async def crash(buffer: SyncBuffer) -> None:
+    """Stop the buffer without flushing, as if the process had been killed."""
+    buffer._task.cancel()
+    await asyncio.gather(buffer._task, return_exceptions=True)
+    buffer._executor.shutdown()
+
+
+@pytest.fixture
+def journal(tmp_path, db_pool):
+    asyncio.run(db.init_db())
+    return str(tmp_path / "sync_journal.jsonl")
+
+
+def test_uncommitted_snapshots_are_replayed(journal):
+    async def run():
+        buffer = SyncBuffer(journal_path=journal, interval=60)
+        await buffer.start()
+        await buffer.submit(1, [sub("a")])
+        await buffer.submit(1, [sub("a"), sub("b", "Spotify")])
+        await buffer.submit(2, [sub("c")])
+        await crash(buffer)
+        assert await names(1) == []
+
+        restarted = SyncBuffer(journal_path=journal, interval=60)
+        await restarted.start()
+        assert len(restarted) == 2
+        await restarted.stop()
+        return await names(1), await names(2)
+
+    assert asyncio.run(run()) == (["Netflix", "Spotify"], ["Netflix"])
+
+
+def test_replay_skips_committed_snapshots(journal):
+    async def run():
+        buffer = SyncBuffer(journal_path=journal, interval=60)
+        await buffer.start()
+        await buffer.submit(2, [sub("c")])
+        await buffer.submit(1, [sub("a", "Old name")])
+        await buffer.flush(1)
+        # Written after user 1's snapshot was committed; a replay must not revert it.
+        await db.apply_subscription_delta(1, None, [sub("a", "New name")], [])
+        await crash(buffer)
+
+        restarted = SyncBuffer(journal_path=journal, interval=60)
+        await restarted.start()
+        pending = sorted(restarted._pending)
+        await restarted.stop()
+        return pending, await names(1), await names(2)
+
+    assert asyncio.run(run()) == ([2], ["New name"], ["Netflix"])
+
+
+def test_torn_last_line_is_ignored(journal):
+    async def run():
+        buffer = SyncBuffer(journal_path=journal, interval=60)
+        await buffer.start()
+        await buffer.submit(1, [sub("a")])
+        await crash(buffer)
+        with open(journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": 5, "user_id": 1, "subscriptions": [sub("x")]})[:30])
+
+        restarted = SyncBuffer(journal_path=journal, interval=60)
+        await restarted.start()
+        await restarted.stop()
+        return await names(1)
+
+    assert asyncio.run(run()) == ["Netflix"]
+
+
+def test_journal_is_removed_once_everything_is_committed(journal):
+    async def run():
+        buffer = SyncBuffer(journal_path=journal, interval=60)
+        await buffer.start()
+        await buffer.submit(1, [sub("a")])
+        assert os.path.exists(journal)
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert not os.path.exists(journal)
+
+
+def test_stop_while_submits_are_in_flight(journal):
+    async def run():
+        buffer = SyncBuffer(journal_path=journal, interval=60)
+        await buffer.start()
+        for round in range(20):
+            submits = [asyncio.create_task(buffer.submit(user_id, [sub("a", f"v{round}")]))
+                       for user_id in range(5)]
+            await asyncio.sleep(0)
+            if round < 19:
+                await asyncio.gather(*submits)
+        # stop() must neither hang nor drop the submits it raced with.
+        await asyncio.wait_for(buffer.stop(), 5)
+        await asyncio.gather(*submits)
+        with pytest.raises(RuntimeError):
+            await buffer.submit(1, [])
+        return [await names(user_id) for user_id in range(5)]
+
+    assert asyncio.run(run()) == [["v19"]] * 5
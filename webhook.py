@@ -0,0 +1,104 @@
+"""Webhook ingestion of Telegram updates.
+
+In webhook mode Telegram POSTs each update to the bot's aiohttp app instead
+of the bot long-polling ``getUpdates``.  The request handler only checks the
+secret token, parses the update and puts it on a bounded queue, so Telegram
+gets its 200 right away; a fixed pool of workers feeds queued updates to the
+aiogram dispatcher.  When the queue is full the handler answers 503 and
+Telegram retries the update later, which keeps memory bounded under bursts.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookIngress:
+    """Accepts webhook requests and processes updates on a bounded worker pool."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret: str, *,
+                 workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE) -> None:
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._secret = secret
+        self._workers = max(1, workers)
+        self._queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=max(1, queue_size))
+        self._tasks: list[asyncio.Task] = []
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Finish queued updates (up to ``timeout`` seconds), then stop the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook shutdown: {self._queue.qsize()} update(s) left unprocessed")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # ── Ingestion ────────────────────────────────────────────────────────────
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp handler for the webhook route."""
+        token = request.headers.get(SECRET_HEADER, "")
+        if self._secret and not hmac.compare_digest(token, self._secret):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self._bot})
+        except Exception as e:
+            logger.warning(f"Discarding malformed webhook update: {e}")
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram redelivers anything that was not answered with 2xx.
+            self.dropped += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self._dispatcher.feed_update(self._bot, update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error handling update {update.update_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "received": self.received,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }